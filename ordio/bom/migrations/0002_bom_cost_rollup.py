@@ -0,0 +1,23 @@
+# Generated by Django 4.2.24 on 2026-10-17 04:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bom', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bom',
+            name='component_cost',
+            field=models.DecimalField(blank=True, decimal_places=4, editable=False, max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='bom',
+            name='operation_cost',
+            field=models.DecimalField(blank=True, decimal_places=4, editable=False, max_digits=14, null=True),
+        ),
+    ]
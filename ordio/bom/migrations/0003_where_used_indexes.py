@@ -0,0 +1,17 @@
+# Generated by Django 4.2.24 on 2026-10-17 04:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bom', '0002_bom_cost_rollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bomcomponent',
+            index=models.Index(fields=['component', 'bom'], name='bomcomponent_where_used_idx'),
+        ),
+    ]
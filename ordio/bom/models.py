@@ -1,10 +1,19 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from contextlib import contextmanager
+import threading
 import uuid
 
 User = get_user_model()
 
+COST_FIELDS = ('component_cost', 'operation_cost')
+
+# BOM ids whose cost refresh is held back by deferred_cost_refresh()
+_deferred = threading.local()
+
 class BOM(models.Model):
     """
     Bill of Materials - Recipe for manufacturing a product
@@ -19,6 +28,12 @@ class BOM(models.Model):
     
     # Metadata
     description = models.TextField(blank=True, help_text="BOM description or notes")
+    
+    # Cached per-unit cost rollup, refreshed whenever a line, a component's
+    # unit cost or a work center's rate changes (null until first computed)
+    component_cost = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True, editable=False)
+    operation_cost = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True, editable=False)
+    
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_boms')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -55,27 +70,107 @@ class BOM(models.Model):
     
     def save(self, *args, **kwargs):
         self.clean()
+        # The cost rollup is maintained by refresh_costs(); an instance loaded
+        # before a line changed must not write its stale copy back
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in COST_FIELDS
+            ]
         super().save(*args, **kwargs)
     
+    @classmethod
+    def refresh_costs(cls, boms):
+        """
+        Recompute the cached cost rollup of the given BOMs (ids or a queryset)
+        in a single UPDATE with one aggregate subquery per cost column
+        """
+        cost_field = DecimalField(max_digits=14, decimal_places=4)
+        component_total = BOMComponent.objects.filter(bom=OuterRef('pk')).order_by().values('bom').annotate(
+            total=Sum(ExpressionWrapper(F('quantity') * F('component__unit_cost'), output_field=cost_field))
+        ).values('total')
+        operation_total = BOMOperation.objects.filter(bom=OuterRef('pk')).order_by().values('bom').annotate(
+            total=Sum(ExpressionWrapper(
+                (F('duration_minutes') + F('setup_time_minutes')) * F('work_center__cost_per_hour') / Value(60),
+                output_field=cost_field
+            ))
+        ).values('total')
+        
+        return cls.objects.filter(pk__in=boms).update(
+            component_cost=Coalesce(Subquery(component_total), Value(0), output_field=cost_field),
+            operation_cost=Coalesce(Subquery(operation_total), Value(0), output_field=cost_field),
+        )
+    
+    @classmethod
+    def refresh_costs_for_components(cls, product_ids):
+        """Refresh every BOM that uses one of the given products as a component"""
+        return cls.refresh_costs(
+            BOMComponent.objects.filter(component_id__in=product_ids).values('bom_id')
+        )
+    
+    @classmethod
+    def refresh_costs_for_work_centers(cls, work_center_ids):
+        """Refresh every BOM with an operation at one of the given work centers"""
+        return cls.refresh_costs(
+            BOMOperation.objects.filter(work_center_id__in=work_center_ids).values('bom_id')
+        )
+    
+    def _ensure_costs(self):
+        if self.component_cost is None or self.operation_cost is None:
+            BOM.refresh_costs([self.pk])
+            self.refresh_from_db(fields=COST_FIELDS)
+    
     def get_total_component_cost(self):
-        """Calculate total cost of all components"""
-        total = 0
-        for component in self.components.all():
-            total += component.get_total_cost()
-        return total
+        """Total cost of all components (for 1 unit), from the cached rollup"""
+        self._ensure_costs()
+        return float(self.component_cost)
     
     def get_total_operation_cost(self):
-        """Calculate total cost of all operations (for 1 unit)"""
-        total = 0
-        for operation in self.operations.all():
-            total += operation.get_operation_cost()
-        return total
+        """Total cost of all operations (for 1 unit), from the cached rollup"""
+        self._ensure_costs()
+        return float(self.operation_cost)
     
     def get_total_bom_cost(self):
         """Get total BOM cost (components + operations)"""
         return self.get_total_component_cost() + self.get_total_operation_cost()
 
 
+@contextmanager
+def deferred_cost_refresh():
+    """
+    Hold back the cost refresh of component/operation line saves and deletes
+    inside the block, then refresh every BOM they touched in one UPDATE.
+
+    Use it around code that writes several lines through save()/delete(),
+    which would otherwise re-aggregate the whole BOM once per line.
+    """
+    if getattr(_deferred, 'bom_ids', None) is not None:
+        # Nested: the outermost block refreshes
+        yield
+        return
+    _deferred.bom_ids = set()
+    try:
+        yield
+        bom_ids = _deferred.bom_ids
+    finally:
+        _deferred.bom_ids = None
+    if bom_ids:
+        BOM.refresh_costs(bom_ids)
+
+
+def refresh_line_bom_cost(line):
+    """Refresh the cost rollup of the BOM a component/operation line belongs to"""
+    bom_ids = getattr(_deferred, 'bom_ids', None)
+    if bom_ids is not None:
+        bom_ids.add(line.bom_id)
+    else:
+        BOM.refresh_costs([line.bom_id])
+    # A BOM instance cached on the line now holds stale costs; drop them so
+    # the next read loads the refreshed values
+    if type(line).bom.is_cached(line):
+        line.bom.component_cost = line.bom.operation_cost = None
+
+
 class BOMComponent(models.Model):
     """
     Raw materials/components required by a BOM
@@ -94,10 +189,23 @@ class BOMComponent(models.Model):
     class Meta:
         unique_together = ['bom', 'component']  # Prevent duplicate components in same BOM
         ordering = ['component__name']
+        indexes = [
+            # Where-used lookups go component -> BOM; the unique index leads with bom
+            models.Index(fields=['component', 'bom'], name='bomcomponent_where_used_idx'),
+        ]
     
     def __str__(self):
         return f"{self.quantity} × {self.component.name}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        refresh_line_bom_cost(self)
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        refresh_line_bom_cost(self)
+        return result
+    
     def get_total_cost(self):
         """Calculate total cost for this component line"""
         return float(self.quantity) * float(self.component.unit_cost)
@@ -135,6 +243,15 @@ class BOMOperation(models.Model):
     def __str__(self):
         return f"{self.sequence}. {self.name} @ {self.work_center.name}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        refresh_line_bom_cost(self)
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        refresh_line_bom_cost(self)
+        return result
+    
     def get_operation_cost(self, quantity=1):
         """Calculate cost for this operation"""
         total_minutes = (float(self.duration_minutes) * quantity) + float(self.setup_time_minutes)
@@ -1,3 +1,193 @@
+from decimal import Decimal
+
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from products.models import Product
+from tests.factories import User, build_mo
+from workcenters.models import WorkCenter
+from .explosion import BOMCycleError, BOMExplosion
+from .models import BOM, BOMComponent, BOMOperation, deferred_cost_refresh
+from .where_used import MAX_LEVELS
+
+
+class BOMCostRollupTest(TestCase):
+    """Cached BOM costs follow line, unit cost and work center rate changes"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='engineer', email='engineer@example.com', password='x'
+        )
+        self.wood = Product.objects.create(name='Wood', sku='WOOD', unit_cost=Decimal('2.00'))
+        self.screw = Product.objects.create(name='Screw', sku='SCREW', unit_cost=Decimal('0.10'))
+        self.saw = WorkCenter.objects.create(name='Saw', code='SAW', cost_per_hour=Decimal('60.00'))
+
+        self.table = self.make_bom('Table', [(self.wood, '4'), (self.screw, '10')])
+        BOMOperation.objects.create(
+            bom=self.table, name='Cut', sequence=1, work_center=self.saw,
+            duration_minutes=20, setup_time_minutes=10
+        )
+        self.shelf = self.make_bom('Shelf', [(self.screw, '4')])
+
+    def make_bom(self, name, lines):
+        product = Product.objects.create(name=name, sku=name.upper(), product_type='FINISHED_GOOD')
+        bom = BOM.objects.create(product=product, name=f'{name} BOM', created_by=self.user)
+        for component, quantity in lines:
+            BOMComponent.objects.create(bom=bom, component=component, quantity=Decimal(quantity))
+        return bom
+
+    def cost(self, bom):
+        return BOM.objects.get(pk=bom.pk).get_total_bom_cost()
+
+    def test_rollup_matches_lines(self):
+        self.assertAlmostEqual(self.cost(self.table), 4 * 2 + 10 * 0.1 + 30 / 60 * 60)
+        self.assertAlmostEqual(self.cost(self.shelf), 0.4)
+
+    def test_unit_cost_change_refreshes_where_used_boms(self):
+        self.wood.unit_cost = Decimal('3.00')
+        with self.assertNumQueries(2):
+            self.wood.save()
+        self.assertAlmostEqual(self.cost(self.table), 4 * 3 + 1 + 30)
+        self.assertAlmostEqual(self.cost(self.shelf), 0.4)
+
+    def test_work_center_rate_change(self):
+        self.saw.cost_per_hour = Decimal('120.00')
+        self.saw.save()
+        self.assertAlmostEqual(BOM.objects.get(pk=self.table.pk).get_total_operation_cost(), 60)
+
+    def test_line_changes_and_stale_instances(self):
+        stale = BOM.objects.get(pk=self.shelf.pk)
+        stale.get_total_bom_cost()
+
+        BOMComponent.objects.create(bom=self.shelf, component=self.wood, quantity=Decimal('1'))
+        stale.description = 'Wall shelf'
+        stale.save()
+        self.assertAlmostEqual(self.cost(self.shelf), 2.4)
+
+        self.shelf.components.get(component=self.screw).delete()
+        self.assertAlmostEqual(self.cost(self.shelf), 2.0)
+
+    def test_multi_line_build_refreshes_once(self):
+        product = Product.objects.create(name='Bench', sku='BENCH', product_type='FINISHED_GOOD')
+        bom = BOM.objects.create(product=product, name='Bench BOM', created_by=self.user)
+        parts = [Product(name=f'Slat {i}', sku=f'SLAT-{i}', unit_cost=Decimal('1.00')) for i in range(5)]
+        Product.objects.bulk_create(parts)
+
+        # One INSERT per line and a single rollup UPDATE
+        with self.assertNumQueries(len(parts) + 2):
+            with deferred_cost_refresh():
+                for part in parts:
+                    BOMComponent.objects.create(bom=bom, component=part, quantity=Decimal('2'))
+                BOMOperation.objects.create(
+                    bom=bom, name='Sand', sequence=1, work_center=self.saw, duration_minutes=6
+                )
+        self.assertAlmostEqual(self.cost(bom), 5 * 2 + 6)
+
+    def test_clone_copies_lines_and_costs(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(
+            f'/api/boms/{self.table.pk}/clone/', {'deactivate_original': True}, format='json'
+        )
+        self.assertEqual(response.status_code, 201)
+        clone = BOM.objects.get(pk=response.data['bom_id'])
+        self.assertEqual(clone.components.count(), 2)
+        self.assertEqual(clone.operations.count(), 1)
+        self.assertAlmostEqual(self.cost(clone), self.cost(self.table))
+
+
+class BOMExplosionTest(TestCase):
+    """Nested BOMs explode to raw materials with one query per level"""
+
+    DEPTH = 12
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='planner', email='planner@example.com', password='x'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.screw = Product.objects.create(name='Screw', sku='SCREW')
+        self.steel = Product.objects.create(name='Steel', sku='STEEL')
+
+        # L0 <- 2 x L1 <- 2 x L2 ... <- L11 <- steel; every level also takes a screw
+        self.levels = [
+            Product.objects.create(name=f'Level {i}', sku=f'L{i}', product_type='FINISHED_GOOD')
+            for i in range(self.DEPTH)
+        ]
+        self.boms = []
+        for i, product in enumerate(self.levels):
+            bom = BOM.objects.create(product=product, name=f'L{i} BOM', created_by=self.user)
+            child = self.levels[i + 1] if i + 1 < self.DEPTH else self.steel
+            BOMComponent.objects.create(bom=bom, component=child, quantity=Decimal('2'))
+            BOMComponent.objects.create(bom=bom, component=self.screw, quantity=Decimal('1'))
+            self.boms.append(bom)
+
+    def test_deep_tree_flattens_in_one_query_per_level(self):
+        explosion = BOMExplosion()
+        with self.assertNumQueries(self.DEPTH + 1):
+            requirements = explosion.explode(self.levels[0].pk, quantity=3)
+
+        self.assertEqual(requirements, {
+            self.steel.pk: Decimal(3 * 2 ** self.DEPTH),
+            self.screw.pk: Decimal(3 * (2 ** self.DEPTH - 1)),
+        })
+        # Sub-assemblies are memoized for further explosions
+        with self.assertNumQueries(0):
+            self.assertEqual(explosion.explode(self.levels[6].pk)[self.steel.pk], 2 ** 6)
+
+    def test_endpoint_and_cycle_detection(self):
+        response = self.client.get(f'/api/boms/{self.boms[10].pk}/explode/?quantity=2')
+        self.assertEqual(
+            {row['product_sku']: row['required_quantity'] for row in response.data['requirements']},
+            {'STEEL': Decimal('8'), 'SCREW': Decimal('6')}
+        )
+
+        BOMComponent.objects.create(bom=self.boms[11], component=self.levels[9], quantity=Decimal('1'))
+        response = self.client.get(f'/api/boms/{self.boms[0].pk}/explode/')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cycle', response.data)
+        with self.assertRaises(BOMCycleError):
+            BOMExplosion().explode(self.levels[0].pk)
+
+    def test_endpoint_rejects_non_positive_quantity(self):
+        for quantity in ('0', '-2', 'NaN', 'Infinity', 'abc'):
+            response = self.client.get(f'/api/boms/{self.boms[0].pk}/explode/?quantity={quantity}')
+            self.assertEqual(response.status_code, 400)
+
+
+class WhereUsedTest(TestCase):
+    """Where-used walks up through sub-assemblies with one query per level"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='buyer', email='buyer@example.com', password='x'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_multi_level_usage_and_open_mos(self):
+        mo = build_mo(self.user, work_order_count=1, component_count=1)
+        part = mo.component_requirements.get().component
+        table = mo.product
+        desk = Product.objects.create(name='Desk', sku='DESK', product_type='FINISHED_GOOD')
+        desk_bom = BOM.objects.create(product=desk, name='Desk BOM', created_by=self.user)
+        BOMComponent.objects.create(bom=desk_bom, component=table, quantity=Decimal('1'))
+
+        # product lookup + two levels + the empty third + open MOs
+        with self.assertNumQueries(5):
+            response = self.client.get(f'/api/products/{part.pk}/where_used/?levels=5')
+        self.assertEqual(
+            [(row['level'], row['product_sku']) for row in response.data['boms']],
+            [(1, table.sku), (2, 'DESK')]
+        )
+        self.assertEqual([row['mo_number'] for row in response.data['open_mos']], [mo.mo_number])
+
+        response = self.client.get(f'/api/products/{part.pk}/where_used/')
+        self.assertEqual(len(response.data['boms']), 1)
 
-# Create your tests here.
+    def test_levels_out_of_range_is_rejected(self):
+        part = Product.objects.create(name='Bolt', sku='BOLT', product_type='RAW_MATERIAL')
+        for levels in (0, MAX_LEVELS + 1):
+            response = self.client.get(f'/api/products/{part.pk}/where_used/?levels={levels}')
+            self.assertEqual(response.status_code, 400)
@@ -4,8 +4,10 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django.shortcuts import get_object_or_404
-from django.db import models, IntegrityError
+from django.db import models, transaction, IntegrityError
 from django.core.exceptions import ValidationError
+from decimal import Decimal, InvalidOperation
+from .explosion import BOMCycleError, explode_bom
 from .models import BOM, BOMComponent, BOMOperation
 from .serializers import (
     BOMSerializer, BOMListSerializer, BOMComponentSerializer,
@@ -69,6 +71,11 @@ class BOMViewSet(viewsets.ModelViewSet):
         GET /api/boms/active/
         """
         active_boms = BOM.objects.filter(is_active=True)
+        page = self.paginate_queryset(active_boms)
+        if page is not None:
+            serializer = BOMListSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = BOMListSerializer(active_boms, many=True)
         return Response(serializer.data)
     
@@ -154,6 +161,46 @@ class BOMViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
     
+    @action(detail=True, methods=['get'])
+    def explode(self, request, pk=None):
+        """
+        Flattened raw material requirements through all sub-assembly levels
+        GET /api/boms/{id}/explode/?quantity={n}
+        """
+        bom = self.get_object()
+        try:
+            quantity = Decimal(request.query_params.get('quantity', '1'))
+        except InvalidOperation:
+            quantity = None
+        if quantity is None or not quantity.is_finite() or quantity <= 0:
+            return Response({'error': 'quantity must be a positive number'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            requirements = explode_bom(bom, quantity)
+        except BOMCycleError as e:
+            return Response({'error': e.message, 'cycle': e.path}, status=status.HTTP_400_BAD_REQUEST)
+        
+        from products.models import Product
+        products = Product.objects.in_bulk(list(requirements))
+        return Response({
+            'bom_id': bom.bom_id,
+            'product': bom.product_id,
+            'quantity': quantity,
+            'requirements': [
+                {
+                    'product_id': product_id,
+                    'product_name': products[product_id].name,
+                    'product_sku': products[product_id].sku,
+                    'unit_of_measure': products[product_id].unit_of_measure,
+                    'required_quantity': required,
+                    'available_stock': products[product_id].current_stock,
+                }
+                for product_id, required in sorted(
+                    requirements.items(), key=lambda item: products[item[0]].name
+                )
+            ]
+        })
+    
     @action(detail=True, methods=['post'])
     def clone(self, request, pk=None):
         """
@@ -169,37 +216,41 @@ class BOMViewSet(viewsets.ModelViewSet):
             original_bom.is_active = False
             original_bom.save()
         
-        # Clone BOM
-        new_bom = BOM.objects.create(
-            product=original_bom.product,
-            name=new_name,
-            version=new_version,
-            description=f'Cloned from {original_bom.name}',
-            created_by=request.user,
-            is_active=not original_bom.is_active  # Make active if original was deactivated
-        )
-        
-        # Clone components
-        for component in original_bom.components.all():
-            BOMComponent.objects.create(
-                bom=new_bom,
-                component=component.component,
-                quantity=component.quantity,
-                unit_of_measure=component.unit_of_measure,
-                notes=component.notes
-            )
-        
-        # Clone operations
-        for operation in original_bom.operations.all():
-            BOMOperation.objects.create(
-                bom=new_bom,
-                name=operation.name,
-                sequence=operation.sequence,
-                work_center=operation.work_center,
-                duration_minutes=operation.duration_minutes,
-                setup_time_minutes=operation.setup_time_minutes,
-                description=operation.description
+        with transaction.atomic():
+            # Clone BOM
+            new_bom = BOM.objects.create(
+                product=original_bom.product,
+                name=new_name,
+                version=new_version,
+                description=f'Cloned from {original_bom.name}',
+                created_by=request.user,
+                is_active=not original_bom.is_active  # Make active if original was deactivated
             )
+            
+            # Clone components and operations; bulk inserts skip the line
+            # save() hooks, so the cost rollup is refreshed once afterwards
+            BOMComponent.objects.bulk_create([
+                BOMComponent(
+                    bom=new_bom,
+                    component_id=component.component_id,
+                    quantity=component.quantity,
+                    notes=component.notes
+                )
+                for component in original_bom.components.all()
+            ])
+            BOMOperation.objects.bulk_create([
+                BOMOperation(
+                    bom=new_bom,
+                    name=operation.name,
+                    sequence=operation.sequence,
+                    work_center_id=operation.work_center_id,
+                    duration_minutes=operation.duration_minutes,
+                    setup_time_minutes=operation.setup_time_minutes,
+                    description=operation.description
+                )
+                for operation in original_bom.operations.all()
+            ])
+            BOM.refresh_costs([new_bom.pk])
         
         return Response(
             BOMSerializer(new_bom, context={'request': request}).data,
@@ -265,6 +316,7 @@ class BOMOperationViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'bom__name', 'bom__product__name', 'work_center__name']
     ordering_fields = ['name', 'sequence', 'bom__name', 'work_center__name']
     ordering = ['bom__product__name', 'sequence']
+    cursor_ordering = ['id']
     
     def get_serializer_class(self):
         if self.action == 'list':
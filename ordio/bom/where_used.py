@@ -0,0 +1,55 @@
+"""
+Where-used: which BOMs consume a product, directly or through sub-assemblies.
+
+The walk goes up one level per query: the BOM lines using the current set
+of products, then the lines using the products those BOMs build, and so on.
+Lookups are served by the component-first index on BOMComponent.
+"""
+from .models import BOMComponent
+
+MAX_LEVELS = 20
+
+
+def where_used(product_id, levels=1):
+    """
+    BOM lines using ``product_id`` up to ``levels`` levels above it.
+
+    Returns ``(usages, products)`` where ``usages`` is a list of dicts, one
+    per BOM line with its ``level`` (1 = direct use), and ``products`` is the
+    set of the product and every product found to (indirectly) consume it.
+    Only active BOMs are followed upward; inactive ones are reported but
+    not walked. Raises ValueError if ``levels`` is not between 1 and
+    MAX_LEVELS.
+    """
+    if not 1 <= levels <= MAX_LEVELS:
+        raise ValueError(f'levels must be between 1 and {MAX_LEVELS}')
+    usages = []
+    products = {product_id}
+    frontier = {product_id}
+    for level in range(1, levels + 1):
+        rows = BOMComponent.objects.filter(component_id__in=frontier).values(
+            'component_id', 'quantity', 'bom_id', 'bom__name', 'bom__version',
+            'bom__is_active', 'bom__product_id', 'bom__product__name', 'bom__product__sku',
+        ).order_by('bom__product__name')
+
+        frontier = set()
+        for row in rows:
+            usages.append({
+                'level': level,
+                'bom_id': row['bom_id'],
+                'bom_name': row['bom__name'],
+                'bom_version': row['bom__version'],
+                'bom_is_active': row['bom__is_active'],
+                'product_id': row['bom__product_id'],
+                'product_name': row['bom__product__name'],
+                'product_sku': row['bom__product__sku'],
+                'component_id': row['component_id'],
+                'quantity': row['quantity'],
+            })
+            # Products already seen are not walked twice, which also stops cycles
+            if row['bom__is_active'] and row['bom__product_id'] not in products:
+                frontier.add(row['bom__product_id'])
+        products |= frontier
+        if not frontier:
+            break
+    return usages, products
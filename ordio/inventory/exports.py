@@ -0,0 +1,75 @@
+"""
+Streaming CSV / NDJSON export of stock ledger rows.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+# (column name, values() lookup) in export order
+EXPORT_COLUMNS = [
+    ('ledger_id', 'ledger_id'),
+    ('transaction_time', 'transaction_time'),
+    ('product', 'product_id'),
+    ('product_sku', 'product__sku'),
+    ('product_name', 'product__name'),
+    ('movement_type', 'movement_type'),
+    ('quantity_change', 'quantity_change'),
+    ('stock_before', 'stock_before'),
+    ('stock_after', 'stock_after'),
+    ('reference_number', 'reference_number'),
+    ('mo_number', 'related_mo__mo_number'),
+    ('created_by_name', 'created_by__username'),
+    ('notes', 'notes'),
+]
+EXPORT_HEADER = [name for name, _ in EXPORT_COLUMNS]
+EXPORT_LOOKUPS = [lookup for _, lookup in EXPORT_COLUMNS]
+
+
+class _StreamRenderer(BaseRenderer):
+    """
+    Selects an export format through ``?format=`` or the Accept header.
+
+    Rows are streamed by the view itself; only error payloads (bad
+    parameters, authentication failures) are rendered here, as JSON.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
+
+
+class CSVRenderer(_StreamRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(_StreamRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class _Echo:
+    """File-like object whose write() returns the value instead of buffering it"""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_HEADER)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(EXPORT_HEADER, row)), cls=DjangoJSONEncoder) + '\n'
+
+
+STREAM_WRITERS = {
+    'csv': csv_lines,
+    'ndjson': ndjson_lines,
+}
@@ -0,0 +1,110 @@
+"""
+EXPLAIN checks for the stock ledger's hot read paths.
+
+Each entry in ``ledger_access_paths`` mirrors a query an endpoint runs
+against ``StockLedger``; ``sequential_scans`` reports the ones whose plan
+reads the whole table instead of an index.
+"""
+import random
+import re
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from products.models import Product
+from .models import StockLedger
+from .partitions import add_months, create_month_partition, is_partitioned, month_start
+
+LEDGER_TABLE = StockLedger._meta.db_table
+
+# Plan lines that mean the ledger (or, when partitioned, one of its monthly
+# partitions or the default partition) is read end to end, per database vendor
+FULL_SCAN_PATTERNS = {
+    'postgresql': re.compile(rf'Seq Scan on {LEDGER_TABLE}(_p\d{{4}}_\d{{2}}|_default)?\b'),
+    'sqlite': re.compile(rf'\bSCAN {LEDGER_TABLE}\b'),
+}
+
+
+def ledger_access_paths(product_id, days=30):
+    """Querysets matching the ledger reads behind the inventory endpoints"""
+    start_date = timezone.now() - timedelta(days=days)
+    return {
+        # GET /api/stock-ledger/by_product/?product_id=
+        'by_product': StockLedger.objects.filter(product_id=product_id)[:100],
+        # GET /api/products/{id}/stock_movements/
+        'product_stock_movements': Product(product_id=product_id).stock_movements.all()[:50],
+        # GET /api/inventory-reports/consumption_analysis/
+        'consumption_analysis': StockLedger.objects.filter(
+            movement_type='MO_CONSUMPTION', transaction_time__gte=start_date
+        ).values('product__name', 'product__sku').annotate(
+            total_consumed=Sum('quantity_change')
+        ).order_by('total_consumed'),
+        # GET /api/inventory-reports/production_analysis/
+        'production_analysis': StockLedger.objects.filter(
+            movement_type='MO_PRODUCTION', transaction_time__gte=start_date
+        ).values('product__name', 'product__sku').annotate(
+            total_produced=Sum('quantity_change')
+        ).order_by('-total_produced'),
+    }
+
+
+def sequential_scans(querysets):
+    """Return {name: plan} for every queryset whose plan full-scans the ledger"""
+    pattern = FULL_SCAN_PATTERNS.get(connection.vendor)
+    if pattern is None:
+        raise ValueError(f'No full-scan pattern for database vendor {connection.vendor!r}')
+
+    offenders = {}
+    for name, queryset in querysets.items():
+        plan = queryset.explain()
+        if pattern.search(plan):
+            offenders[name] = plan
+    return offenders
+
+
+def seed_ledger(rows, products=1000, days=5 * 365, batch_size=10000):
+    """
+    Insert synthetic products and ledger rows spread over ``days`` days.
+
+    Rows are bulk inserted without touching product balances, so this is
+    only meant for scratch databases or a transaction that is rolled back.
+    When the ledger is partitioned, a monthly partition is created for every
+    seeded month first, so the rows land where partition pruning applies
+    instead of in the default partition.
+    """
+    seeded = Product.objects.bulk_create([
+        Product(name=f'Plan check {i}', sku=f'PLAN-{i:06d}') for i in range(products)
+    ])
+    product_ids = [product.product_id for product in seeded]
+    movement_types = [choice for choice, _ in StockLedger.MOVEMENT_TYPES]
+    now = timezone.now()
+    span = days * 24 * 3600
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            if is_partitioned(cursor):
+                month = month_start(timezone.localtime(now - timedelta(seconds=span)))
+                while month <= timezone.localdate(now):
+                    create_month_partition(cursor, month)
+                    month = add_months(month, 1)
+
+    for start in range(0, rows, batch_size):
+        StockLedger.objects.bulk_create([
+            StockLedger(
+                product_id=random.choice(product_ids),
+                quantity_change=Decimal('1.00'),
+                stock_before=Decimal('0.00'),
+                stock_after=Decimal('1.00'),
+                movement_type=random.choice(movement_types),
+                transaction_time=now - timedelta(seconds=random.randrange(span)),
+            )
+            for _ in range(min(batch_size, rows - start))
+        ])
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {LEDGER_TABLE}')
+    return product_ids
@@ -0,0 +1 @@
+# Management module
\ No newline at end of file
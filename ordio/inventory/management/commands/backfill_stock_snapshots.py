@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from inventory.models import StockLedger, StockSnapshot
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily closing stock snapshots from the stock ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=5000,
+            help='Ledger rows fetched and snapshots written per round trip',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        # Stream the ledger in (product, time) order; the last row of each
+        # product/day holds that day's closing balance
+        rows = StockLedger.objects.order_by('product_id', 'transaction_time').values_list(
+            'product_id', 'transaction_time', 'stock_after'
+        )
+
+        written = 0
+        batch = []
+        current_key = None
+        current_stock = None
+
+        def flush():
+            nonlocal written
+            StockSnapshot.objects.bulk_create(
+                batch,
+                update_conflicts=True,
+                unique_fields=['product', 'date'],
+                update_fields=['closing_stock'],
+            )
+            written += len(batch)
+            batch.clear()
+
+        with transaction.atomic():
+            for product_id, transaction_time, stock_after in rows.iterator(chunk_size=chunk_size):
+                key = (product_id, timezone.localtime(transaction_time).date())
+                if current_key is not None and key != current_key:
+                    batch.append(StockSnapshot(
+                        product_id=current_key[0], date=current_key[1], closing_stock=current_stock
+                    ))
+                    if len(batch) >= chunk_size:
+                        flush()
+                current_key = key
+                current_stock = stock_after
+
+            if current_key is not None:
+                batch.append(StockSnapshot(
+                    product_id=current_key[0], date=current_key[1], closing_stock=current_stock
+                ))
+            if batch:
+                flush()
+
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} stock snapshots'))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from inventory.ledger_plans import ledger_access_paths, seed_ledger, sequential_scans
+from inventory.models import StockLedger
+
+
+class Command(BaseCommand):
+    help = 'Fail if any hot stock ledger query plans a sequential scan of the ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Insert this many synthetic ledger rows first (rolled back afterwards)',
+        )
+        parser.add_argument(
+            '--product',
+            help='Product id to plan per-product queries for (defaults to any ledger product)',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['seed']:
+                self.stdout.write(f"Seeding {options['seed']} ledger rows...")
+                product_ids = seed_ledger(options['seed'])
+                product_id = options['product'] or product_ids[0]
+            else:
+                product_id = options['product'] or StockLedger.objects.values_list(
+                    'product_id', flat=True
+                ).first()
+                if product_id is None:
+                    raise CommandError('Ledger is empty; pass --seed to plan against synthetic rows')
+
+            offenders = sequential_scans(ledger_access_paths(product_id))
+            # Seeded rows are never kept
+            transaction.set_rollback(True)
+
+        for name, plan in offenders.items():
+            self.stdout.write(self.style.WARNING(f'{name}:\n{plan}\n'))
+        if offenders:
+            raise CommandError(f"Sequential scan on the ledger in: {', '.join(offenders)}")
+        self.stdout.write(self.style.SUCCESS('All ledger queries use an index'))
@@ -0,0 +1,49 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from inventory.partitions import detach_partitions_before, ensure_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = 'Create upcoming monthly stock ledger partitions and optionally detach old ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months-ahead',
+            type=int,
+            default=3,
+            help='Number of future months to create partitions for',
+        )
+        parser.add_argument(
+            '--detach-before',
+            metavar='YYYY-MM',
+            help='Detach partitions for months before this one so they can be archived',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Ledger partitioning requires PostgreSQL')
+
+        detach_before = None
+        if options['detach_before']:
+            try:
+                year, month = options['detach_before'].split('-')
+                detach_before = date(int(year), int(month), 1)
+            except ValueError:
+                raise CommandError('--detach-before must be in YYYY-MM format')
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            if not is_partitioned(cursor):
+                raise CommandError('Stock ledger is not partitioned; run migrations first')
+
+            created = ensure_partitions(cursor, options['months_ahead'])
+            detached = detach_partitions_before(cursor, detach_before) if detach_before else []
+
+        for name in created:
+            self.stdout.write(f'Created {name}')
+        for name in detached:
+            self.stdout.write(self.style.WARNING(f'Detached {name}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(created)} partition(s) created, {len(detached)} detached'
+        ))
@@ -0,0 +1,71 @@
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import DecimalField, Sum, Value
+from django.db.models.functions import Coalesce
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Recompute product stock balances from the stock ledger and report drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--apply',
+            action='store_true',
+            help='Overwrite drifted balances with the ledger totals (default: report only)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Rows fetched per round trip while streaming',
+        )
+
+    def handle(self, *args, **options):
+        apply_fix = options['apply']
+        chunk_size = options['chunk_size']
+
+        # One grouped query over the ledger, streamed with a server-side cursor
+        balances = Product.objects.annotate(
+            ledger_total=Coalesce(
+                Sum('stock_movements__quantity_change'),
+                Value(0),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            )
+        ).order_by().values_list('product_id', 'sku', 'current_stock', 'ledger_total')
+
+        checked = 0
+        drifted = []
+        for product_id, sku, current_stock, ledger_total in balances.iterator(chunk_size=chunk_size):
+            checked += 1
+            if current_stock != ledger_total:
+                drifted.append((product_id, ledger_total))
+                self.stdout.write(
+                    self.style.WARNING(
+                        f'  {sku}: stored={current_stock}, ledger={ledger_total}, '
+                        f'drift={current_stock - ledger_total}'
+                    )
+                )
+
+        self.stdout.write(f'Checked {checked} products, {len(drifted)} drifted')
+
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS('All stock balances match the ledger'))
+            return
+
+        if not apply_fix:
+            self.stdout.write('Run with --apply to overwrite drifted balances')
+            return
+
+        with transaction.atomic():
+            Product.objects.bulk_update(
+                [
+                    Product(product_id=product_id, current_stock=Decimal(ledger_total))
+                    for product_id, ledger_total in drifted
+                ],
+                ['current_stock'],
+                batch_size=chunk_size,
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(drifted)} stock balances'))
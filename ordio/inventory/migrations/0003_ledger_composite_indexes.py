@@ -0,0 +1,29 @@
+# Generated by Django 4.2.24 on 2026-10-17 04:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_stock_snapshot'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='stockledger',
+            name='inventory_s_product_bcb5e0_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='stockledger',
+            name='inventory_s_movemen_553342_idx',
+        ),
+        migrations.AddIndex(
+            model_name='stockledger',
+            index=models.Index(fields=['product', '-transaction_time'], name='ledger_product_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockledger',
+            index=models.Index(fields=['movement_type', 'transaction_time'], name='ledger_type_time_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+
+from inventory.partitions import partition_ledger, unpartition_ledger
+
+
+class Migration(migrations.Migration):
+    """
+    Range-partition the stock ledger by month on PostgreSQL.
+
+    Existing rows are copied into monthly partitions covering the oldest
+    movement up to a few months ahead. Other databases keep a plain table.
+    """
+
+    dependencies = [
+        ('inventory', '0003_ledger_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_ledger, unpartition_ledger),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.24 on 2026-10-17 04:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def reserve_open_orders(apps, schema_editor):
+    """Reserve the unconsumed requirements of MOs confirmed before reservations existed"""
+    MOComponentRequirement = apps.get_model('manufacturing', 'MOComponentRequirement')
+    StockReservation = apps.get_model('inventory', 'StockReservation')
+
+    requirements = MOComponentRequirement.objects.filter(
+        mo__status__in=['CONFIRMED', 'IN_PROGRESS'],
+        required_quantity__gt=models.F('consumed_quantity'),
+    ).values_list('mo_id', 'component_id', 'required_quantity', 'consumed_quantity')
+    StockReservation.objects.bulk_create([
+        StockReservation(mo_id=mo_id, product_id=component_id, quantity=required - consumed)
+        for mo_id, component_id, required, consumed in requirements.iterator()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manufacturing', '0005_where_used_indexes'),
+        ('products', '0002_product_trigram_search'),
+        ('inventory', '0004_partition_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('mo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='manufacturing.manufacturingorder')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='products.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'quantity'], name='reservation_product_qty_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stockreservation',
+            constraint=models.UniqueConstraint(fields=('mo', 'product'), name='unique_reservation_per_mo_product'),
+        ),
+        migrations.RunPython(reserve_open_orders, migrations.RunPython.noop),
+    ]
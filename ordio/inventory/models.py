@@ -1,12 +1,56 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from datetime import datetime
 from decimal import Decimal
+from products.models import Product
 import uuid
 
 User = get_user_model()
 
+
+def supports_update_returning():
+    """
+    Whether the database can return columns from an UPDATE: PostgreSQL, and
+    SQLite from 3.35. MariaDB only supports RETURNING on INSERT and DELETE,
+    and Oracle uses RETURNING ... INTO, so both read the row back instead.
+    """
+    if connection.vendor == 'postgresql':
+        return True
+    return connection.vendor == 'sqlite' and connection.Database.sqlite_version_info >= (3, 35)
+
+
+def apply_stock_change(product_id, quantity_change):
+    """
+    Add ``quantity_change`` to a product's stored balance and return the new
+    balance. Where the database supports it this is a single
+    ``UPDATE ... RETURNING``; otherwise the row is locked and read back.
+    """
+    quantity_change = Decimal(str(quantity_change))
+    if not supports_update_returning():
+        Product.objects.filter(pk=product_id).update(current_stock=F('current_stock') + quantity_change)
+        # The UPDATE already holds the row lock
+        return Product.objects.values_list('current_stock', flat=True).get(pk=product_id)
+    
+    opts = Product._meta
+    stock = opts.get_field('current_stock')
+    quote = connection.ops.quote_name
+    table, column, pk = quote(opts.db_table), quote(stock.column), quote(opts.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET {column} = {column} + %s WHERE {pk} = %s RETURNING {column}',
+            [quantity_change, opts.pk.get_db_prep_value(product_id, connection)],
+        )
+        row = cursor.fetchone()
+    if row is None:
+        raise Product.DoesNotExist(f'Product not found: {product_id}')
+    # SQLite hands back a float; round it to the column's scale
+    return Decimal(str(row[0])).quantize(Decimal(1).scaleb(-stock.decimal_places))
+
+
 class StockLedger(models.Model):
     """
     Immutable stock movement log - tracks every inventory transaction
@@ -55,8 +99,10 @@ class StockLedger(models.Model):
     class Meta:
         ordering = ['-transaction_time']
         indexes = [
-            models.Index(fields=['product']),
-            models.Index(fields=['movement_type']),
+            # Per-product history newest first (by_product, stock_movements, as_of)
+            models.Index(fields=['product', '-transaction_time'], name='ledger_product_time_idx'),
+            # Movement-type reports over a time window (consumption/production analysis)
+            models.Index(fields=['movement_type', 'transaction_time'], name='ledger_type_time_idx'),
             models.Index(fields=['transaction_time']),
             models.Index(fields=['related_mo']),
         ]
@@ -66,35 +112,284 @@ class StockLedger(models.Model):
         return f"{self.product.name}: {sign}{self.quantity_change} ({self.get_movement_type_display()})"
     
     def save(self, *args, **kwargs):
-        # Calculate stock levels
-        if not self.stock_before:
-            self.stock_before = self.product.current_stock
-        
-        self.stock_after = self.stock_before + self.quantity_change
+        if not self._state.adding:
+            # Existing entries are immutable; never re-apply their stock change
+            super().save(*args, **kwargs)
+            return
         
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # Apply the change in SQL so concurrent writers cannot lose
+            # updates; the UPDATE locks the row and returns the new balance
+            self.stock_after = apply_stock_change(self.product_id, self.quantity_change)
+            self.stock_before = self.stock_after - Decimal(str(self.quantity_change))
+            
+            super().save(*args, **kwargs)
+            StockSnapshot.record([self])
         
-        # Update product current stock
-        self.product.current_stock = self.stock_after
-        self.product.save(update_fields=['current_stock'])
+        # Keep the caller's product instance in step with the database
+        if StockLedger.product.is_cached(self):
+            self.product.current_stock = self.stock_after
     
     @classmethod
     def create_movement(cls, product, quantity_change, movement_type, **kwargs):
         """
         Factory method to create stock movement with atomic transaction
         """
+        return cls.objects.create(
+            product=product,
+            quantity_change=quantity_change,
+            movement_type=movement_type,
+            **kwargs
+        )
+    
+    @classmethod
+    def create_movements(cls, movements, check_stock=False):
+        """
+        Record a batch of stock movements in one transaction.
+        
+        Each item is a dict with ``product`` (instance or pk), ``quantity_change``,
+        ``movement_type`` and any other ledger fields. All affected product rows
+        are locked with one ordered SELECT ... FOR UPDATE, the ledger rows are
+        bulk inserted and the balances are moved with a single UPDATE.
+        
+        With ``check_stock`` a movement that would take a product below zero
+        raises ValueError and nothing is written.
+        """
+        movements = list(movements)
+        if not movements:
+            return []
+        
+        def product_pk(product):
+            return product.pk if isinstance(product, Product) else product
+        
+        # Lock in primary key order so concurrent batches cannot deadlock
+        product_ids = sorted({product_pk(m['product']) for m in movements}, key=str)
+        
         with transaction.atomic():
-            # Lock the product row to prevent race conditions
-            product = product.__class__.objects.select_for_update().get(pk=product.pk)
+            locked = {
+                product.pk: product
+                for product in Product.objects.select_for_update()
+                .filter(pk__in=product_ids)
+                .order_by('pk')
+            }
+            balances = {pk: product.current_stock for pk, product in locked.items()}
+            missing = set(product_ids) - set(balances)
+            if missing:
+                raise Product.DoesNotExist(
+                    f"Products not found: {', '.join(str(pk) for pk in missing)}"
+                )
+            
+            entries = []
+            deltas = {}
+            for data in movements:
+                data = dict(data)
+                product = data.pop('product')
+                pk = product_pk(product)
+                quantity_change = Decimal(str(data.pop('quantity_change')))
+                
+                stock_before = balances[pk]
+                if check_stock and quantity_change < 0 and stock_before + quantity_change < 0:
+                    raise ValueError(
+                        f"Insufficient stock for {locked[pk].name}. "
+                        f"Required: {-quantity_change}, Available: {stock_before}"
+                    )
+                balances[pk] = stock_before + quantity_change
+                deltas[pk] = deltas.get(pk, Decimal('0')) + quantity_change
+                
+                entry = cls(
+                    quantity_change=quantity_change,
+                    stock_before=stock_before,
+                    stock_after=balances[pk],
+                    **data
+                )
+                entry.product = product if isinstance(product, Product) else locked[pk]
+                entries.append(entry)
+            
+            cls.objects.bulk_create(entries)
             
-            movement = cls.objects.create(
-                product=product,
-                quantity_change=quantity_change,
-                movement_type=movement_type,
-                **kwargs
+            Product.objects.filter(pk__in=deltas).update(
+                current_stock=Case(
+                    *[When(pk=pk, then=F('current_stock') + delta) for pk, delta in deltas.items()],
+                    default=F('current_stock'),
+                    output_field=models.DecimalField(max_digits=10, decimal_places=2),
+                )
+            )
+            StockSnapshot.record(entries)
+        
+        for entry in entries:
+            entry.product.current_stock = balances[entry.product_id]
+        
+        return entries
+
+
+class StockSnapshot(models.Model):
+    """
+    Closing stock balance of a product at the end of a day, kept for
+    point-in-time inventory queries without scanning the ledger
+    """
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='stock_snapshots')
+    date = models.DateField()
+    closing_stock = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'date'], name='unique_stock_snapshot_per_day')
+        ]
+    
+    def __str__(self):
+        return f"{self.product_id} @ {self.date}: {self.closing_stock}"
+    
+    @classmethod
+    def record(cls, entries):
+        """Upsert the closing balance of every product/day touched by ledger entries"""
+        closing = {}
+        for entry in entries:
+            day = timezone.localtime(entry.transaction_time).date()
+            closing[(entry.product_id, day)] = entry.stock_after
+        
+        cls.objects.bulk_create(
+            [
+                cls(product_id=product_id, date=day, closing_stock=stock)
+                for (product_id, day), stock in closing.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['product', 'date'],
+            update_fields=['closing_stock'],
+        )
+    
+    @classmethod
+    def annotate_stock_as_of(cls, queryset, as_of):
+        """
+        Annotate a Product queryset with ``stock_as_of``.
+        
+        A date means end of that day and is answered from the nearest snapshot
+        on or before it. A datetime uses the last snapshot before its day plus
+        that day's ledger rows up to the given time.
+        """
+        decimal_field = models.DecimalField(max_digits=10, decimal_places=2)
+        
+        if isinstance(as_of, datetime):
+            day_start = timezone.localtime(as_of).replace(hour=0, minute=0, second=0, microsecond=0)
+            same_day = StockLedger.objects.filter(
+                product=OuterRef('pk'),
+                transaction_time__gte=day_start,
+                transaction_time__lte=as_of,
+            ).order_by('-transaction_time').values('stock_after')[:1]
+            before = cls.objects.filter(
+                product=OuterRef('pk'), date__lt=day_start.date()
+            ).order_by('-date').values('closing_stock')[:1]
+            stock = Coalesce(
+                Subquery(same_day), Subquery(before), Value(0), output_field=decimal_field
             )
+        else:
+            before = cls.objects.filter(
+                product=OuterRef('pk'), date__lte=as_of
+            ).order_by('-date').values('closing_stock')[:1]
+            stock = Coalesce(Subquery(before), Value(0), output_field=decimal_field)
+        
+        return queryset.annotate(stock_as_of=stock)
+
+
+class StockReservation(models.Model):
+    """
+    Stock promised to a confirmed manufacturing order but not yet consumed.
+    
+    Available-to-promise for a product is its on-hand stock less the sum of
+    its reservations. Reservations are created when an MO is confirmed,
+    redone when a confirmed MO's requirements are edited and released when
+    its components are consumed or the MO leaves the confirmed states.
+    """
+    product = models.ForeignKey('products.Product', on_delete=models.CASCADE, related_name='reservations')
+    mo = models.ForeignKey(
+        'manufacturing.ManufacturingOrder',
+        on_delete=models.CASCADE,
+        related_name='reservations'
+    )
+    quantity = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['mo', 'product'], name='unique_reservation_per_mo_product')
+        ]
+        indexes = [
+            # Per-product reserved totals are summed from this index alone
+            models.Index(fields=['product', 'quantity'], name='reservation_product_qty_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.quantity} of {self.product_id} for MO {self.mo_id}"
+    
+    @classmethod
+    def reserved_total(cls, product, exclude_mo=None):
+        """
+        Expression for the total reserved of ``product`` (usually an
+        OuterRef), optionally leaving out one MO's own reservation
+        """
+        reservations = cls.objects.filter(product=product)
+        if exclude_mo is not None:
+            reservations = reservations.exclude(mo=exclude_mo)
+        total = reservations.order_by().values('product').annotate(total=Sum('quantity')).values('total')
+        return Coalesce(
+            Subquery(total), Value(Decimal('0')),
+            output_field=models.DecimalField(max_digits=12, decimal_places=2)
+        )
+    
+    @classmethod
+    def annotate_available(cls, products, exclude_mo=None):
+        """Annotate ``reserved_stock`` and ``available_stock`` onto a Product queryset"""
+        return products.annotate(
+            reserved_stock=cls.reserved_total(OuterRef('pk'), exclude_mo),
+            available_stock=F('current_stock') - F('reserved_stock'),
+        )
+    
+    @classmethod
+    def available_for(cls, product_ids, exclude_mo=None):
+        """{product pk: available-to-promise} for any set of products, in one query"""
+        products = cls.annotate_available(Product.objects.filter(pk__in=product_ids), exclude_mo)
+        return dict(products.values_list('pk', 'available_stock'))
+    
+    @classmethod
+    def reserve_for_mo(cls, manufacturing_order):
+        """
+        Reserve the unconsumed quantity of every MO requirement.
+        
+        The component rows are locked while availability is checked so two
+        MOs confirmed concurrently cannot both claim the same units. Raises
+        ValueError and reserves nothing if any component is short.
+        """
+        requirements = [
+            req for req in manufacturing_order.component_requirements.select_related('component')
+            if req.remaining_quantity > 0
+        ]
+        product_ids = sorted({req.component_id for req in requirements}, key=str)
+        
+        with transaction.atomic():
+            # Lock in primary key order, like StockLedger.create_movements
+            locked = cls.annotate_available(
+                Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk'),
+                exclude_mo=manufacturing_order
+            )
+            available = dict(locked.values_list('pk', 'available_stock'))
             
-            return movement
+            for req in requirements:
+                if available[req.component_id] < req.remaining_quantity:
+                    raise ValueError(
+                        f"Insufficient available stock for {req.component.name}. "
+                        f"Required: {req.remaining_quantity}, Available: {available[req.component_id]}"
+                    )
+            
+            cls.release_for_mo(manufacturing_order)
+            return cls.objects.bulk_create([
+                cls(product_id=req.component_id, mo=manufacturing_order, quantity=req.remaining_quantity)
+                for req in requirements
+            ])
+    
+    @classmethod
+    def release_for_mo(cls, manufacturing_order):
+        """Drop every reservation held by the MO"""
+        return cls.objects.filter(mo=manufacturing_order).delete()
 
 
 class StockAdjustment(models.Model):
@@ -158,19 +453,9 @@ class StockAdjustment(models.Model):
     
     def generate_adjustment_number(self):
         """Generate unique adjustment number"""
-        from datetime import datetime
+        from manufacturing.models import NumberSequence
         date_str = datetime.now().strftime('%Y%m')
-        last_adj = StockAdjustment.objects.filter(
-            adjustment_number__startswith=f'ADJ{date_str}'
-        ).order_by('adjustment_number').last()
-        
-        if last_adj:
-            last_num = int(last_adj.adjustment_number[-4:])
-            new_num = last_num + 1
-        else:
-            new_num = 1
-            
-        return f'ADJ{date_str}{new_num:04d}'
+        return NumberSequence.next_number(f'ADJ{date_str}')
     
     def approve(self, approver):
         """Approve the adjustment and create stock movement"""
@@ -199,49 +484,66 @@ class StockAdjustment(models.Model):
 class StockOperations:
     """Utility class for common stock operations"""
     
+    @staticmethod
+    def _consumption_movements(manufacturing_order):
+        """Build consumption movements for the unconsumed part of each MO requirement"""
+        requirements = [
+            req for req in manufacturing_order.component_requirements.select_related('component')
+            if req.remaining_quantity > 0
+        ]
+        notes = (
+            f"Component consumption for {manufacturing_order.quantity_to_produce}x "
+            f"{manufacturing_order.product.name}"
+        )
+        movements = [
+            {
+                'product': req.component,
+                'quantity_change': -req.remaining_quantity,
+                'movement_type': 'MO_CONSUMPTION',
+                'reference_number': manufacturing_order.mo_number,
+                'related_mo': manufacturing_order,
+                'notes': notes,
+            }
+            for req in requirements
+        ]
+        return requirements, movements
+    
+    @staticmethod
+    def _mark_consumed(manufacturing_order, requirements):
+        """Record requirements as fully consumed in one UPDATE"""
+        manufacturing_order.component_requirements.filter(
+            pk__in=[req.pk for req in requirements]
+        ).update(consumed_quantity=F('required_quantity'), updated_at=timezone.now())
+    
+    @staticmethod
+    def _production_movement(manufacturing_order):
+        return {
+            'product': manufacturing_order.product,
+            'quantity_change': manufacturing_order.quantity_to_produce,
+            'movement_type': 'MO_PRODUCTION',
+            'reference_number': manufacturing_order.mo_number,
+            'related_mo': manufacturing_order,
+            'notes': f"Production of {manufacturing_order.quantity_to_produce}x {manufacturing_order.product.name}",
+        }
+    
     @staticmethod
     def consume_components_for_mo(manufacturing_order):
         """Consume components when MO is completed"""
-        movements = []
-        
         with transaction.atomic():
-            components = manufacturing_order.get_required_components()
-            
-            for comp_data in components:
-                component = comp_data['component']
-                required_qty = comp_data['total_required']
-                
-                if not component.can_consume(required_qty):
-                    raise ValueError(
-                        f"Insufficient stock for {component.name}. "
-                        f"Required: {required_qty}, Available: {component.current_stock}"
-                    )
-                
-                # Create consumption movement
-                movement = StockLedger.create_movement(
-                    product=component,
-                    quantity_change=-required_qty,
-                    movement_type='MO_CONSUMPTION',
-                    reference_number=manufacturing_order.mo_number,
-                    related_mo=manufacturing_order,
-                    notes=f"Component consumption for {manufacturing_order.quantity_to_produce}x {manufacturing_order.product.name}"
-                )
-                movements.append(movement)
+            requirements, movements = StockOperations._consumption_movements(manufacturing_order)
+            entries = StockLedger.create_movements(movements, check_stock=True)
+            StockOperations._mark_consumed(manufacturing_order, requirements)
+            StockReservation.release_for_mo(manufacturing_order)
         
-        return movements
+        return entries
     
     @staticmethod
     def produce_finished_goods_for_mo(manufacturing_order):
         """Add finished goods when MO is completed"""
         with transaction.atomic():
-            movement = StockLedger.create_movement(
-                product=manufacturing_order.product,
-                quantity_change=manufacturing_order.quantity_to_produce,
-                movement_type='MO_PRODUCTION',
-                reference_number=manufacturing_order.mo_number,
-                related_mo=manufacturing_order,
-                notes=f"Production of {manufacturing_order.quantity_to_produce}x {manufacturing_order.product.name}"
-            )
+            movement = StockLedger.create_movements(
+                [StockOperations._production_movement(manufacturing_order)]
+            )[0]
             
             # Update MO quantities
             manufacturing_order.quantity_produced = manufacturing_order.quantity_to_produce
@@ -252,10 +554,18 @@ class StockOperations:
     @staticmethod
     def complete_manufacturing_order(manufacturing_order):
         """Complete full MO cycle - consume components and produce goods"""
-        consume_movements = StockOperations.consume_components_for_mo(manufacturing_order)
-        produce_movement = StockOperations.produce_finished_goods_for_mo(manufacturing_order)
+        with transaction.atomic():
+            # Consumption and production share one lock, insert and balance update
+            requirements, movements = StockOperations._consumption_movements(manufacturing_order)
+            movements.append(StockOperations._production_movement(manufacturing_order))
+            entries = StockLedger.create_movements(movements, check_stock=True)
+            StockOperations._mark_consumed(manufacturing_order, requirements)
+            StockReservation.release_for_mo(manufacturing_order)
+            
+            manufacturing_order.quantity_produced = manufacturing_order.quantity_to_produce
+            manufacturing_order.save(update_fields=['quantity_produced'])
         
         return {
-            'consumed': consume_movements,
-            'produced': produce_movement
+            'consumed': entries[:-1],
+            'produced': entries[-1]
         }
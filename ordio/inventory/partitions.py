@@ -0,0 +1,194 @@
+"""
+Monthly range partitioning of the stock ledger on PostgreSQL.
+
+The ledger table is partitioned by ``transaction_time`` with one partition
+per calendar month plus a default partition that catches anything outside
+the created ranges. PostgreSQL requires the partition key in the primary
+key, so the table's key is ``(ledger_id, transaction_time)``; the ORM still
+treats ``ledger_id`` as the primary key, which stays unique because it is a
+random UUID.
+"""
+from datetime import date
+
+from django.db import connection
+from django.utils import timezone
+
+LEDGER_TABLE = 'inventory_stockledger'
+DEFAULT_PARTITION = f'{LEDGER_TABLE}_default'
+
+
+def month_start(value):
+    return date(value.year, value.month, 1)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{LEDGER_TABLE}_p{month:%Y_%m}'
+
+
+def is_partitioned(cursor):
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table pt "
+        "JOIN pg_class c ON c.oid = pt.partrelid "
+        "WHERE c.relname = %s AND pg_table_is_visible(c.oid))",
+        [LEDGER_TABLE],
+    )
+    return cursor.fetchone()[0]
+
+
+def existing_partitions(cursor):
+    """Names of the ledger's attached partitions"""
+    cursor.execute(
+        "SELECT child.relname FROM pg_inherits i "
+        "JOIN pg_class parent ON parent.oid = i.inhparent "
+        "JOIN pg_class child ON child.oid = i.inhrelid "
+        "WHERE parent.relname = %s AND pg_table_is_visible(parent.oid)",
+        [LEDGER_TABLE],
+    )
+    return {row[0] for row in cursor.fetchall()}
+
+
+def create_month_partition(cursor, month, parent=LEDGER_TABLE):
+    """
+    Create the partition for ``month`` unless it exists.
+
+    Rows already sitting in the default partition for that month are moved
+    into the new partition, since PostgreSQL refuses to attach a range the
+    default partition holds rows for. Run inside a transaction.
+    """
+    name = partition_name(month)
+    lower, upper = month, add_months(month, 1)
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [name])
+    if cursor.fetchone()[0]:
+        return False
+
+    cursor.execute(f'CREATE TEMP TABLE _ledger_moved (LIKE {parent}) ON COMMIT DROP')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} '
+        f'WHERE transaction_time >= %s AND transaction_time < %s RETURNING *) '
+        f'INSERT INTO _ledger_moved SELECT * FROM moved',
+        [lower, upper],
+    )
+    cursor.execute(
+        f'CREATE TABLE {name} PARTITION OF {parent} FOR VALUES FROM (%s) TO (%s)',
+        [lower, upper],
+    )
+    cursor.execute(f'INSERT INTO {parent} SELECT * FROM _ledger_moved')
+    cursor.execute('DROP TABLE _ledger_moved')
+    return True
+
+
+def ensure_partitions(cursor, months_ahead=3, parent=LEDGER_TABLE):
+    """Create partitions from the current month up to ``months_ahead`` months out"""
+    current = month_start(timezone.localdate())
+    return [
+        partition_name(month)
+        for month in (add_months(current, i) for i in range(months_ahead + 1))
+        if create_month_partition(cursor, month, parent)
+    ]
+
+
+def detach_partitions_before(cursor, month):
+    """
+    Detach monthly partitions that end on or before ``month``.
+
+    Detached partitions become ordinary tables that can be dumped, moved to
+    cheaper storage or dropped without touching the live ledger.
+    """
+    detached = []
+    for name in sorted(existing_partitions(cursor)):
+        if name == DEFAULT_PARTITION:
+            continue
+        partition_month = date(int(name[-7:-3]), int(name[-2:]), 1)
+        if add_months(partition_month, 1) <= month:
+            cursor.execute(f'ALTER TABLE {LEDGER_TABLE} DETACH PARTITION {name}')
+            detached.append(name)
+    return detached
+
+
+def _table_definitions(cursor):
+    """Secondary index and foreign key DDL of the current ledger table"""
+    cursor.execute(
+        "SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i "
+        "WHERE i.indrelid = %s::regclass AND NOT i.indisprimary",
+        [LEDGER_TABLE],
+    )
+    indexes = [row[0].replace(' ON ONLY ', ' ON ') for row in cursor.fetchall()]
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = 'f'",
+        [LEDGER_TABLE],
+    )
+    foreign_keys = cursor.fetchall()
+    return indexes, foreign_keys
+
+
+def _rebuild_ledger(cursor, partitioned, months_ahead=3):
+    indexes, foreign_keys = _table_definitions(cursor)
+    staging = f'{LEDGER_TABLE}_rebuild'
+
+    if partitioned:
+        cursor.execute(
+            f'CREATE TABLE {staging} (LIKE {LEDGER_TABLE} INCLUDING DEFAULTS, '
+            f'PRIMARY KEY (ledger_id, transaction_time)) PARTITION BY RANGE (transaction_time)'
+        )
+        cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION}_rebuild PARTITION OF {staging} DEFAULT')
+        cursor.execute(f'SELECT min(transaction_time) FROM {LEDGER_TABLE}')
+        oldest = cursor.fetchone()[0]
+        current = month_start(timezone.localdate())
+        month = month_start(timezone.localtime(oldest)) if oldest else current
+        while month <= current:
+            cursor.execute(
+                f'CREATE TABLE {partition_name(month)} PARTITION OF {staging} '
+                f'FOR VALUES FROM (%s) TO (%s)',
+                [month, add_months(month, 1)],
+            )
+            month = add_months(month, 1)
+    else:
+        cursor.execute(
+            f'CREATE TABLE {staging} (LIKE {LEDGER_TABLE} INCLUDING DEFAULTS, PRIMARY KEY (ledger_id))'
+        )
+
+    cursor.execute(f'INSERT INTO {staging} SELECT * FROM {LEDGER_TABLE}')
+    cursor.execute(f'DROP TABLE {LEDGER_TABLE}')
+    cursor.execute(f'ALTER TABLE {staging} RENAME TO {LEDGER_TABLE}')
+    cursor.execute(f'ALTER TABLE {LEDGER_TABLE} RENAME CONSTRAINT {staging}_pkey TO {LEDGER_TABLE}_pkey')
+    if partitioned:
+        cursor.execute(f'ALTER TABLE {DEFAULT_PARTITION}_rebuild RENAME TO {DEFAULT_PARTITION}')
+
+    for definition in indexes:
+        cursor.execute(definition)
+    for name, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE {LEDGER_TABLE} ADD CONSTRAINT {name} {definition}')
+
+    if partitioned:
+        ensure_partitions(cursor, months_ahead)
+
+
+def partition_ledger(apps, schema_editor):
+    """Migration step: move the ledger into a monthly partitioned table"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if not is_partitioned(cursor):
+            _rebuild_ledger(cursor, partitioned=True)
+
+
+def unpartition_ledger(apps, schema_editor):
+    """Migration step: fold the partitions back into one plain table"""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if is_partitioned(cursor):
+            _rebuild_ledger(cursor, partitioned=False)
+
+
+def ledger_is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        return is_partitioned(cursor)
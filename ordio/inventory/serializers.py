@@ -41,6 +41,15 @@ class StockLedgerCreateSerializer(serializers.ModelSerializer):
         validated_data['created_by'] = self.context['request'].user
         return StockLedger.create_movement(**validated_data)
 
+class StockMovementBulkItemSerializer(serializers.Serializer):
+    """Serializer for one line of a bulk stock movement request"""
+    
+    product = serializers.UUIDField()
+    quantity_change = serializers.DecimalField(max_digits=10, decimal_places=2)
+    movement_type = serializers.ChoiceField(choices=StockLedger.MOVEMENT_TYPES)
+    reference_number = serializers.CharField(max_length=100, required=False, allow_blank=True)
+    notes = serializers.CharField(required=False, allow_blank=True)
+
 class StockAdjustmentSerializer(serializers.ModelSerializer):
     """Serializer for Stock Adjustments"""
     
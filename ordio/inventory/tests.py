@@ -1,3 +1,344 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import json
+from io import StringIO
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from manufacturing.models import ManufacturingOrder, MOComponentRequirement, WorkOrder
+from products.models import Product
+from tests.factories import User, build_mo
+from .models import StockLedger, StockOperations, StockReservation, StockSnapshot
+from .partitions import existing_partitions, month_start, partition_name
+
+
+class StockMovementBatchTest(TestCase):
+    """create_movements keeps ledger rows and balances consistent"""
+
+    def test_batch_chains_balances_per_product(self):
+        bolt = Product.objects.create(name='Bolt', sku='BOLT')
+        nut = Product.objects.create(name='Nut', sku='NUT')
+
+        # savepoint, lock, ledger insert, balance update, snapshot upsert, release
+        with self.assertNumQueries(6):
+            entries = StockLedger.create_movements([
+                {'product': bolt, 'quantity_change': Decimal('10'), 'movement_type': 'MANUAL_IN'},
+                {'product': nut.pk, 'quantity_change': Decimal('4'), 'movement_type': 'MANUAL_IN'},
+                {'product': bolt, 'quantity_change': Decimal('-3'), 'movement_type': 'MANUAL_OUT'},
+            ])
+
+        self.assertEqual(
+            [(e.stock_before, e.stock_after) for e in entries],
+            [(Decimal('0'), Decimal('10')), (Decimal('0'), Decimal('4')), (Decimal('10'), Decimal('7'))]
+        )
+        self.assertEqual(bolt.current_stock, Decimal('7'))
+        bolt.refresh_from_db()
+        nut.refresh_from_db()
+        self.assertEqual(bolt.current_stock, Decimal('7'))
+        self.assertEqual(nut.current_stock, Decimal('4'))
+
+
+class CompleteManufacturingOrderTest(TestCase):
+    """MO completion consumes requirements and produces goods in one batch"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='manager', email='manager@example.com', password='x'
+        )
+
+    def test_consumes_requirements_in_constant_queries(self):
+        mo = build_mo(self.user, work_order_count=1, component_count=150)
+
+        # requirements, lock, insert, balances, consumed, reservations
+        # released, MO plus savepoints; SQLite may split the ledger insert
+        # into a couple of batches
+        with CaptureQueriesContext(connection) as queries:
+            movements = StockOperations.complete_manufacturing_order(mo)
+        self.assertLessEqual(len(queries), 13)
+
+        self.assertEqual(len(movements['consumed']), 150)
+        self.assertEqual(movements['produced'].stock_after, Decimal('5'))
+        requirement = mo.component_requirements.select_related('component').first()
+        self.assertEqual(requirement.consumed_quantity, requirement.required_quantity)
+        self.assertEqual(requirement.component.current_stock, Decimal('90'))
+
+    def test_insufficient_stock_writes_nothing(self):
+        mo = build_mo(self.user, work_order_count=1, component_count=3)
+        short = mo.component_requirements.first().component
+        Product.objects.filter(pk=short.pk).update(current_stock=Decimal('1'))
+
+        with self.assertRaises(ValueError):
+            StockOperations.complete_manufacturing_order(mo)
+
+        self.assertFalse(StockLedger.objects.exists())
+        self.assertFalse(mo.component_requirements.filter(consumed_quantity__gt=0).exists())
+
+    def test_last_work_order_is_not_completed_on_shortage(self):
+        mo = build_mo(self.user, work_order_count=2, component_count=3)
+        ManufacturingOrder.objects.filter(pk=mo.pk).update(status='IN_PROGRESS')
+        last = mo.work_orders.get(status='PENDING')
+        WorkOrder.objects.filter(pk=last.pk).update(status='IN_PROGRESS', actual_start_date=timezone.now())
+        short = mo.component_requirements.first().component
+        Product.objects.filter(pk=short.pk).update(current_stock=Decimal('1'))
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(f'/api/work-orders/{last.pk}/complete/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(short.name, response.data['error'])
+
+        mo.refresh_from_db()
+        last.refresh_from_db()
+        short.refresh_from_db()
+        self.assertEqual(mo.status, 'IN_PROGRESS')
+        self.assertEqual(last.status, 'IN_PROGRESS')
+        self.assertEqual(short.current_stock, Decimal('1'))
+        self.assertFalse(StockLedger.objects.exists())
+
+
+class StockLedgerSummaryTest(TestCase):
+    """summary is one grouped query plus the recent movements"""
+
+    def test_summary_totals(self):
+        user = User.objects.create_user(username='manager', email='m@example.com', password='x')
+        client = APIClient()
+        client.force_authenticate(user)
+        bolt = Product.objects.create(name='Bolt', sku='BOLT')
+        StockLedger.create_movements([
+            {'product': bolt, 'quantity_change': Decimal('10'), 'movement_type': 'MANUAL_IN'},
+            {'product': bolt, 'quantity_change': Decimal('5'), 'movement_type': 'MANUAL_IN'},
+            {'product': bolt, 'quantity_change': Decimal('-4'), 'movement_type': 'MO_CONSUMPTION'},
+        ])
+
+        with self.assertNumQueries(2):
+            response = client.get('/api/stock-ledger/summary/?days=30')
+
+        self.assertEqual(response.data['total_movements'], 3)
+        self.assertEqual(response.data['total_in'], Decimal('15'))
+        self.assertEqual(response.data['total_out'], Decimal('4'))
+        self.assertEqual(response.data['net_change'], Decimal('11'))
+        self.assertEqual(response.data['movement_types']['MANUAL_IN']['count'], 2)
+        self.assertNotIn('ADJUSTMENT', response.data['movement_types'])
+        self.assertEqual(len(response.data['recent_movements']), 3)
+
+
+class StockSnapshotTest(TestCase):
+    """Point-in-time stock is answered from daily snapshots"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='manager', email='m@example.com', password='x')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.bolt = Product.objects.create(name='Bolt', sku='BOLT')
+
+    def move(self, quantity, when):
+        StockLedger.create_movements([{
+            'product': self.bolt, 'quantity_change': Decimal(quantity),
+            'movement_type': 'MANUAL_IN', 'transaction_time': when,
+        }])
+
+    def test_movements_maintain_closing_balance_and_as_of(self):
+        day_one = timezone.make_aware(datetime(2025, 3, 1, 9))
+        day_two = timezone.make_aware(datetime(2025, 3, 3, 9))
+        self.move('10', day_one)
+        self.move('5', day_one + timedelta(hours=2))
+        self.move('-4', day_two)
+
+        closing = dict(self.bolt.stock_snapshots.values_list('date', 'closing_stock'))
+        self.assertEqual(closing, {date(2025, 3, 1): Decimal('15'), date(2025, 3, 3): Decimal('11')})
+
+        def stock_on(as_of):
+            response = self.client.get(f'/api/inventory-reports/stock_levels/?as_of={as_of}')
+            return response.data['stock_levels'][0]['stock']
+
+        self.assertEqual(stock_on('2025-02-28'), Decimal('0'))
+        self.assertEqual(stock_on('2025-03-02'), Decimal('15'))
+        self.assertEqual(stock_on('2025-03-01T10:00:00Z'), Decimal('10'))
+        self.assertEqual(stock_on('2025-03-03T08:00:00Z'), Decimal('15'))
+        self.assertEqual(stock_on('2025-03-04'), Decimal('11'))
+
+    def test_backfill_rebuilds_snapshots(self):
+        self.move('7', timezone.make_aware(datetime(2025, 3, 1, 9)))
+        self.move('2', timezone.make_aware(datetime(2025, 3, 2, 9)))
+        StockSnapshot.objects.all().delete()
+
+        call_command('backfill_stock_snapshots', stdout=StringIO())
+
+        closing = dict(self.bolt.stock_snapshots.values_list('date', 'closing_stock'))
+        self.assertEqual(closing, {date(2025, 3, 1): Decimal('7'), date(2025, 3, 2): Decimal('9')})
+
+
+class LedgerQueryPlanTest(TestCase):
+    """Hot ledger reads stay on an index on a large seeded ledger"""
+
+    def test_no_sequential_scans(self):
+        # The 1M-row check needs Postgres statistics; SQLite plans from the
+        # schema alone, so a small ledger is enough there
+        rows = 1_000_000 if connection.vendor == 'postgresql' else 2000
+        call_command('check_ledger_plans', seed=rows, stdout=StringIO())
+        self.assertFalse(StockLedger.objects.exists())
+
+
+class StockLedgerExportTest(TestCase):
+    """The ledger streams as CSV or NDJSON with optional filters"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='auditor', email='auditor@example.com', password='x'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.bolt = Product.objects.create(name='Bolt', sku='BOLT')
+        self.nut = Product.objects.create(name='Nut', sku='NUT')
+        for product, quantity, day in [(self.bolt, '5', 1), (self.nut, '7', 2), (self.bolt, '-2', 3)]:
+            StockLedger.objects.create(
+                product=product, quantity_change=Decimal(quantity), movement_type='MANUAL_IN',
+                transaction_time=timezone.make_aware(datetime(2025, 3, day, 9))
+            )
+
+    def export(self, query):
+        response = self.client.get(f'/api/stock-ledger/export/?{query}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        lines = self.export('format=csv&product={}'.format(self.bolt.product_id)).splitlines()
+        self.assertTrue(lines[0].startswith('ledger_id,transaction_time,product,product_sku'))
+        self.assertEqual(len(lines), 3)
+        self.assertIn(',BOLT,Bolt,MANUAL_IN,5.00,0.00,5.00,', lines[1])
+        self.assertIn(',-2.00,5.00,3.00,', lines[2])
+
+    def test_ndjson_export_with_date_window(self):
+        body = self.export('format=ndjson&from=2025-03-02&to=2025-03-03')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['product_sku'] for row in rows], ['NUT', 'BOLT'])
+        self.assertEqual(rows[0]['quantity_change'], '7.00')
+
+    def test_invalid_parameters(self):
+        response = self.client.get('/api/stock-ledger/export/?format=csv&from=yesterday')
+        self.assertEqual(response.status_code, 400)
+
+
+class StockReservationTest(TestCase):
+    """Confirmed MOs reserve stock so later orders cannot promise it twice"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='manager', email='manager@example.com', password='x'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.glue = Product.objects.create(name='Glue', sku='GLUE', current_stock=Decimal('15'))
+        self.first = build_mo(self.user, work_order_count=0, component_count=1, suffix='A')
+        self.second = build_mo(self.user, work_order_count=0, component_count=1, suffix='B')
+        for mo in (self.first, self.second):
+            MOComponentRequirement.objects.create(
+                mo=mo, component=self.glue,
+                quantity_per_unit=Decimal('2'), required_quantity=Decimal('10')
+            )
+
+    def confirm(self, mo):
+        return self.client.post(f'/api/manufacturing-orders/{mo.pk}/confirm/')
+
+    def glue_availability(self):
+        response = self.client.get(f'/api/inventory-reports/availability/?product={self.glue.pk}')
+        row = response.data['availability'][0]
+        return row['reserved_stock'], row['available_stock']
+
+    def test_confirm_reserves_and_cancel_releases(self):
+        self.assertEqual(self.confirm(self.first).status_code, 200)
+        self.assertEqual(self.glue_availability(), (Decimal('10'), Decimal('5')))
+
+        response = self.confirm(self.second)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Glue', response.data['error'])
+        self.assertFalse(self.second.reservations.exists())
+
+        detail = self.client.get(f'/api/manufacturing-orders/{self.second.pk}/').data
+        glue = next(c for c in detail['component_requirements'] if c['component_sku'] == 'GLUE')
+        self.assertEqual(glue['available_stock'], '5.00')
+        self.assertEqual(glue['shortage'], Decimal('5'))
+        self.assertFalse(detail['component_availability_check'])
+
+        self.first.refresh_from_db()
+        self.first.status = 'CANCELED'
+        self.first.save()
+        self.assertEqual(self.glue_availability(), (Decimal('0'), Decimal('15')))
+        self.assertEqual(self.confirm(self.second).status_code, 200)
+
+    def test_back_to_draft_releases_reservations(self):
+        self.confirm(self.first)
+        response = self.client.patch(
+            f'/api/manufacturing-orders/{self.first.pk}/', {'status': 'DRAFT'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.first.reservations.exists())
+        self.assertEqual(self.glue_availability(), (Decimal('0'), Decimal('15')))
+
+    def test_requirement_edits_on_confirmed_mo_follow_reservations(self):
+        self.confirm(self.first)
+        url = f'/api/manufacturing-orders/{self.first.pk}'
+        glue = self.first.component_requirements.get(component=self.glue)
+
+        response = self.client.patch(
+            f'{url}/update_component/?component_id={glue.pk}', {'required_quantity': '20'}, format='json'
+        )
+        self.assertEqual(response.status_code, 400)
+        glue.refresh_from_db()
+        self.assertEqual(glue.required_quantity, Decimal('10'))
+        self.assertEqual(self.glue_availability(), (Decimal('10'), Decimal('5')))
+
+        response = self.client.patch(
+            f'{url}/update_component/?component_id={glue.pk}', {'required_quantity': '12'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.glue_availability(), (Decimal('12'), Decimal('3')))
+
+        response = self.client.delete(f'{url}/remove_component/?component_id={glue.pk}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.glue_availability(), (Decimal('0'), Decimal('15')))
+
+        response = self.client.post(f'{url}/add_component/', {
+            'component': self.glue.pk, 'quantity_per_unit': '4', 'required_quantity': '16',
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(self.first.component_requirements.filter(component=self.glue).exists())
+
+        response = self.client.post(f'{url}/add_component/', {
+            'component': self.glue.pk, 'quantity_per_unit': '1', 'required_quantity': '5',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.glue_availability(), (Decimal('5'), Decimal('10')))
+
+    def test_consumption_releases_reservations(self):
+        self.confirm(self.first)
+        self.first.refresh_from_db()
+        StockOperations.complete_manufacturing_order(self.first)
+
+        self.assertFalse(StockReservation.objects.filter(mo=self.first).exists())
+        self.assertEqual(self.glue_availability(), (Decimal('0'), Decimal('5')))
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Ledger partitioning is PostgreSQL only')
+class LedgerPartitionTest(TestCase):
+    """Monthly ledger partitions are created ahead and receive new movements"""
+
+    def test_movements_land_in_the_month_partition(self):
+        call_command('create_ledger_partitions', months_ahead=2, stdout=StringIO())
+        current = partition_name(month_start(timezone.localdate()))
+        with connection.cursor() as cursor:
+            self.assertIn(current, existing_partitions(cursor))
 
-# Create your tests here.
+        bolt = Product.objects.create(name='Bolt', sku='BOLT')
+        entry = StockLedger.create_movement(bolt, Decimal('3'), 'MANUAL_IN')
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {current} WHERE ledger_id = %s', [entry.ledger_id])
+            self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertEqual(StockLedger.objects.get(pk=entry.pk).quantity_change, Decimal('3'))
@@ -3,17 +3,53 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.filters import SearchFilter, OrderingFilter
-from django.db.models import Sum, Q, F
+from django.db.models import Count, Sum, Q, F
+from django.http import StreamingHttpResponse
 from django.utils import timezone
-from datetime import timedelta
-from .models import StockLedger, StockAdjustment, StockOperations
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time, timedelta
+import uuid
+from .exports import CSVRenderer, NDJSONRenderer, EXPORT_LOOKUPS, STREAM_WRITERS
+from .models import StockLedger, StockAdjustment, StockOperations, StockReservation, StockSnapshot
 from .serializers import (
-    StockLedgerSerializer, StockLedgerCreateSerializer,
+    StockLedgerSerializer, StockLedgerCreateSerializer, StockMovementBulkItemSerializer,
     StockAdjustmentSerializer, StockAdjustmentApprovalSerializer,
     ProductStockSummarySerializer, StockMovementSummarySerializer
 )
 from products.models import Product
 
+EXPORT_CHUNK_SIZE = 2000
+
+
+def parse_as_of(value):
+    """Parse an ?as_of= value into a date or an aware datetime (None if absent)"""
+    if not value:
+        return None
+    parsed_date = parse_date(value)
+    if parsed_date is not None:
+        return parsed_date
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError('as_of must be a date (YYYY-MM-DD) or an ISO datetime')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def as_of_end(as_of):
+    """Latest instant covered by an as_of value (end of day for dates)"""
+    if isinstance(as_of, datetime):
+        return as_of
+    return timezone.make_aware(datetime.combine(as_of, time.max))
+
+
+def stock_levels_queryset(products, as_of):
+    """Annotate products with ``stock``: current, or from snapshots when as_of is given"""
+    if as_of is None:
+        return products.annotate(stock=F('current_stock'))
+    return StockSnapshot.annotate_stock_as_of(products, as_of).annotate(stock=F('stock_as_of'))
+
+
 class StockLedgerViewSet(viewsets.ModelViewSet):
     """
     ViewSet for Stock Ledger operations
@@ -42,31 +78,35 @@ class StockLedgerViewSet(viewsets.ModelViewSet):
         
         movements = StockLedger.objects.filter(transaction_time__gte=start_date)
         
-        # Calculate totals
-        total_in = movements.filter(quantity_change__gt=0).aggregate(
-            total=Sum('quantity_change')
-        )['total'] or 0
+        # One grouped pass yields per-type counts and in/out totals
+        per_type = {
+            row['movement_type']: row
+            for row in movements.order_by().values('movement_type').annotate(
+                count=Count('pk'),
+                total_in=Sum('quantity_change', filter=Q(quantity_change__gt=0)),
+                total_out=Sum('quantity_change', filter=Q(quantity_change__lt=0)),
+            )
+        }
         
-        total_out = movements.filter(quantity_change__lt=0).aggregate(
-            total=Sum('quantity_change')
-        )['total'] or 0
+        total_in = sum(row['total_in'] or 0 for row in per_type.values())
+        total_out = sum(row['total_out'] or 0 for row in per_type.values())
+        total_movements = sum(row['count'] for row in per_type.values())
         
         # Movement types breakdown
         movement_types = {}
         for movement_type, display_name in StockLedger.MOVEMENT_TYPES:
-            count = movements.filter(movement_type=movement_type).count()
-            if count > 0:
+            if movement_type in per_type:
                 movement_types[movement_type] = {
                     'display_name': display_name,
-                    'count': count
+                    'count': per_type[movement_type]['count']
                 }
         
         # Recent movements
-        recent = movements[:20]
+        recent = movements.select_related('product', 'created_by', 'related_mo')[:20]
         
         return Response({
             'period_days': days,
-            'total_movements': movements.count(),
+            'total_movements': total_movements,
             'total_in': total_in,
             'total_out': abs(total_out),
             'net_change': total_in + total_out,
@@ -74,6 +114,31 @@ class StockLedgerViewSet(viewsets.ModelViewSet):
             'recent_movements': StockLedgerSerializer(recent, many=True).data
         })
     
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Record several stock movements in one transaction
+        POST /api/stock-ledger/bulk/
+        """
+        # Product ids are resolved in bulk by create_movements, not per line
+        serializer = StockMovementBulkItemSerializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        movements = [
+            dict(item, created_by=request.user)
+            for item in serializer.validated_data
+        ]
+        try:
+            entries = StockLedger.create_movements(movements)
+        except Product.DoesNotExist as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(
+            StockLedgerSerializer(entries, many=True).data,
+            status=status.HTTP_201_CREATED
+        )
+    
     @action(detail=False, methods=['get'])
     def by_product(self, request):
         """
@@ -88,9 +153,55 @@ class StockLedgerViewSet(viewsets.ModelViewSet):
             )
         
         movements = StockLedger.objects.filter(product_id=product_id)
+        page = self.paginate_queryset(movements)
+        if page is not None:
+            serializer = StockLedgerSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = StockLedgerSerializer(movements, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        """
+        Stream ledger rows oldest first as CSV or newline-delimited JSON
+        GET /api/stock-ledger/export/?format=csv|ndjson&from=&to=&product={uuid}
+        """
+        params = request.query_params
+        try:
+            start = parse_as_of(params.get('from'))
+            end = parse_as_of(params.get('to'))
+            product_id = uuid.UUID(params['product']) if params.get('product') else None
+        except ValueError:
+            return Response(
+                {'error': 'from/to must be ISO dates or datetimes and product a valid UUID'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        movements = StockLedger.objects.all()
+        if start is not None:
+            if not isinstance(start, datetime):
+                start = timezone.make_aware(datetime.combine(start, time.min))
+            movements = movements.filter(transaction_time__gte=start)
+        if end is not None:
+            movements = movements.filter(transaction_time__lte=as_of_end(end))
+        if product_id is not None:
+            movements = movements.filter(product_id=product_id)
+
+        # Plain tuples over a server-side cursor keep memory flat however
+        # many rows are exported
+        rows = movements.order_by('transaction_time', 'ledger_id').values_list(
+            *EXPORT_LOOKUPS
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            STREAM_WRITERS[renderer.format](rows),
+            content_type=f'{renderer.media_type}; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename="stock-ledger.{renderer.format}"'
+        return response
+
 class StockAdjustmentViewSet(viewsets.ModelViewSet):
     """
     ViewSet for Stock Adjustment operations
@@ -143,6 +254,11 @@ class StockAdjustmentViewSet(viewsets.ModelViewSet):
         GET /api/stock-adjustments/pending/
         """
         pending = StockAdjustment.objects.filter(is_approved=False)
+        page = self.paginate_queryset(pending)
+        if page is not None:
+            serializer = StockAdjustmentSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = StockAdjustmentSerializer(pending, many=True)
         return Response(serializer.data)
 
@@ -156,32 +272,75 @@ class InventoryReportView(viewsets.ViewSet):
     def stock_summary(self, request):
         """
         Get current stock summary for all products
-        GET /api/inventory-reports/stock_summary/
+        GET /api/inventory-reports/stock_summary/?as_of={date|datetime}
         """
-        products = Product.objects.filter(is_active=True)
+        try:
+            as_of = parse_as_of(request.query_params.get('as_of'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        products = stock_levels_queryset(Product.objects.filter(is_active=True), as_of)
         
         # Add stock status counts
-        total_products = products.count()
-        in_stock = products.filter(current_stock__gt=0).count()
-        out_of_stock = products.filter(current_stock__lte=0).count()
-        low_stock = products.filter(
-            current_stock__lte=F('minimum_stock'),
-            current_stock__gt=0
-        ).count()
+        summary = products.aggregate(
+            total_products=Count('pk'),
+            in_stock=Count('pk', filter=Q(stock__gt=0)),
+            out_of_stock=Count('pk', filter=Q(stock__lte=0)),
+            low_stock=Count('pk', filter=Q(stock__lte=F('minimum_stock'), stock__gt=0)),
+        )
         
         # Get products with recent movements
-        recent_movements = StockLedger.objects.select_related('product').all()[:100]
+        recent_movements = StockLedger.objects.select_related('product')
+        if as_of is not None:
+            recent_movements = recent_movements.filter(transaction_time__lte=as_of_end(as_of))
+        recent_movements = recent_movements[:100]
         
         return Response({
-            'summary': {
-                'total_products': total_products,
-                'in_stock': in_stock,
-                'out_of_stock': out_of_stock,
-                'low_stock': low_stock
-            },
+            'summary': summary,
             'recent_movements': StockLedgerSerializer(recent_movements, many=True).data
         })
     
+    @action(detail=False, methods=['get'])
+    def stock_levels(self, request):
+        """
+        Get per-product stock, optionally at a point in time
+        GET /api/inventory-reports/stock_levels/?as_of={date|datetime}&product={uuid}
+        """
+        try:
+            as_of = parse_as_of(request.query_params.get('as_of'))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        products = Product.objects.filter(is_active=True)
+        product_id = request.query_params.get('product')
+        if product_id:
+            products = products.filter(product_id=product_id)
+        
+        levels = stock_levels_queryset(products, as_of).values(
+            'product_id', 'sku', 'name', 'stock'
+        )
+        
+        return Response({
+            'as_of': request.query_params.get('as_of'),
+            'stock_levels': list(levels)
+        })
+    
+    @action(detail=False, methods=['get'])
+    def availability(self, request):
+        """
+        On-hand, reserved and available-to-promise stock per product
+        GET /api/inventory-reports/availability/?product={uuid}&product={uuid}
+        """
+        products = Product.objects.filter(is_active=True)
+        product_ids = request.query_params.getlist('product')
+        if product_ids:
+            products = products.filter(product_id__in=product_ids)
+        
+        rows = StockReservation.annotate_available(products).values(
+            'product_id', 'sku', 'name', 'current_stock', 'reserved_stock', 'available_stock'
+        )
+        return Response({'availability': list(rows)})
+    
     @action(detail=False, methods=['get'])
     def consumption_analysis(self, request):
         """
@@ -0,0 +1,156 @@
+"""
+Efficiency analytics over completed work orders.
+
+For each operator, work center or BOM operation and each day, week or
+month, the database returns the summed minutes and counts in a single
+grouped query; the rates are derived from those sums, so a period's
+figure weighs every work order by its time instead of averaging per-row
+percentages.
+
+- performance: estimated minutes / actual minutes (``get_efficiency_percentage``
+  over the whole group; may exceed 100)
+- availability: actual minutes / (actual + paused minutes)
+- oee: availability x performance (capped at 100); quality is not tracked,
+  so it counts as 100%
+- on_time: share of scheduled work orders completed by their scheduled end
+"""
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, DateField, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import WorkOrder
+
+PERIODS = ('day', 'week', 'month')
+DEFAULT_DAYS = 90
+
+# dimension -> (key lookup, label lookups)
+DIMENSIONS = {
+    'operator': ('operator_id', ['operator__username']),
+    'work_center': ('work_center_id', ['work_center__code', 'work_center__name']),
+    'operation': ('bom_operation_id', ['bom_operation__name', 'bom_operation__bom__name']),
+}
+
+SERIES_FIELDS = [
+    'work_orders', 'estimated_minutes', 'actual_minutes', 'pause_minutes',
+    'performance', 'availability', 'oee', 'on_time', 'average_delay_minutes',
+]
+
+
+def _percentage(numerator, denominator):
+    return round(numerator / denominator * 100, 2) if denominator else None
+
+
+def _rates(sums):
+    """Rates for one group from its summed minutes and counts"""
+    performance = _percentage(sums['timed_estimated'], sums['actual_minutes'])
+    availability = _percentage(sums['actual_minutes'], sums['actual_minutes'] + sums['pause_minutes'])
+    late = sums['late']
+    return {
+        'work_orders': sums['work_orders'],
+        'estimated_minutes': sums['estimated_minutes'],
+        'actual_minutes': sums['actual_minutes'],
+        'pause_minutes': sums['pause_minutes'],
+        'performance': performance,
+        'availability': availability,
+        'oee': (
+            round(availability * min(performance, 100) / 100, 2)
+            if performance is not None and availability is not None else None
+        ),
+        'on_time': _percentage(sums['scheduled'] - late, sums['scheduled']),
+        'average_delay_minutes': (
+            round(sums['delay'].total_seconds() / 60 / late, 1) if late else None
+        ),
+    }
+
+
+def efficiency_trends(dimension, date_from, date_to, period='week', key=None):
+    """
+    Per-period efficiency series for each operator, work center or operation.
+
+    Covers work orders completed between ``date_from`` and ``date_to``
+    (inclusive), optionally only the one with id ``key``. Returns the list
+    of ``periods`` and one entry per key with its ``label``, a column per
+    metric aligned to ``periods`` (None where it had no work) and the same
+    metrics over the whole range as ``totals``.
+    """
+    if dimension not in DIMENSIONS:
+        raise ValueError(f"dimension must be one of: {', '.join(DIMENSIONS)}")
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of: {', '.join(PERIODS)}")
+    if date_to < date_from:
+        raise ValueError('to must not be before from')
+    key_lookup, label_lookups = DIMENSIONS[dimension]
+
+    # Bounds as instants so the completion date index can be used
+    work_orders = WorkOrder.objects.filter(
+        status='COMPLETED',
+        completion_date__gte=timezone.make_aware(datetime.combine(date_from, time.min)),
+        completion_date__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min)),
+    )
+    if key is not None:
+        work_orders = work_orders.filter(**{key_lookup: key})
+
+    late = Q(completion_date__gt=F('scheduled_end_date'))
+    rows = work_orders.values(
+        key_lookup, *label_lookups,
+        period_start=Trunc('completion_date', period, output_field=DateField()),
+    ).annotate(
+        work_orders=Count('pk'),
+        estimated_minutes=Sum('estimated_duration_minutes'),
+        # Work orders without recorded time have no performance yet
+        timed_estimated=Sum('estimated_duration_minutes', filter=Q(actual_duration_minutes__gt=0)),
+        actual_minutes=Sum('actual_duration_minutes'),
+        pause_minutes=Sum('total_pause_minutes'),
+        scheduled=Count('pk', filter=Q(scheduled_end_date__isnull=False)),
+        late=Count('pk', filter=late),
+        delay=Sum(
+            ExpressionWrapper(F('completion_date') - F('scheduled_end_date'), output_field=DurationField()),
+            filter=late,
+        ),
+    ).order_by()
+
+    counters = ['work_orders', 'estimated_minutes', 'timed_estimated', 'actual_minutes',
+                'pause_minutes', 'scheduled', 'late']
+    groups = {}
+    periods = set()
+    for row in rows:
+        for name in counters:
+            row[name] = row[name] or 0
+        row['delay'] = row['delay'] or timedelta(0)
+        periods.add(row['period_start'])
+
+        group = groups.get(row[key_lookup])
+        if group is None:
+            group = groups[row[key_lookup]] = {
+                'label': ' / '.join(str(row[lookup]) for lookup in label_lookups if row[lookup]),
+                'periods': {},
+                'totals': dict.fromkeys(counters, 0),
+            }
+            group['totals']['delay'] = timedelta(0)
+        group['periods'][row['period_start']] = _rates(row)
+        for name in counters + ['delay']:
+            group['totals'][name] += row[name]
+
+    periods = sorted(periods)
+    series = []
+    for group_key, group in groups.items():
+        entry = {'key': group_key, 'label': group['label'] or None}
+        for name in SERIES_FIELDS:
+            entry[name] = [
+                group['periods'][start][name] if start in group['periods'] else None
+                for start in periods
+            ]
+        entry['totals'] = _rates(group['totals'])
+        series.append(entry)
+    series.sort(key=lambda entry: (-entry['totals']['work_orders'], entry['label'] or ''))
+
+    return {
+        'dimension': dimension,
+        'period': period,
+        'from': date_from,
+        'to': date_to,
+        'periods': periods,
+        'series': series,
+    }
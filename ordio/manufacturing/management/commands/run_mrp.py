@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from manufacturing.mrp import run_mrp
+
+
+class Command(BaseCommand):
+    help = 'Allocate stock across open manufacturing orders and report shortages and planned replenishment'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='List every component, not only those with a shortage or planned replenishment',
+        )
+
+    def handle(self, *args, **options):
+        plan = run_mrp()
+
+        self.stdout.write(
+            f"{plan['open_mo_count']} open MOs, {plan['totals']['components']} components"
+        )
+        for row in plan['components']:
+            if not options['all'] and not row['shortage'] and not row['planned_quantity']:
+                continue
+            line = (
+                f"{row['product_sku']:<20} need {row['gross_requirement']:>10} "
+                f"on hand {row['on_hand']:>10} short {row['shortage']:>10} "
+                f"{row['replenishment']} {row['planned_quantity']}"
+            )
+            self.stdout.write(self.style.WARNING(line) if row['shortage'] else line)
+
+        totals = plan['totals']
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['short_components']} short components across {totals['short_mos']} MOs, "
+            f"{totals['planned_purchases']} purchases planned"
+        ))
@@ -0,0 +1,48 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from manufacturing.scheduling import reschedule_work_orders
+
+
+class Command(BaseCommand):
+    help = 'Forward-schedule pending work orders against work center capacity'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            help='Schedule from this date/time (ISO format, default: now)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Compute the schedule without saving it',
+        )
+
+    def handle(self, *args, **options):
+        start = None
+        if options['start']:
+            try:
+                start = datetime.fromisoformat(options['start'])
+            except ValueError:
+                raise CommandError(f"Invalid --start: {options['start']}")
+            if timezone.is_naive(start):
+                start = timezone.make_aware(start)
+
+        schedule = reschedule_work_orders(start=start, dry_run=options['dry_run'])
+
+        for row in schedule['work_centers']:
+            self.stdout.write(
+                f"{row['work_center_id']}  {row['work_order_count']:>6} WOs  "
+                f"{row['scheduled_minutes']:>8} min  until {row['finish']:%Y-%m-%d %H:%M}"
+            )
+        for row in schedule['unscheduled']:
+            self.stdout.write(self.style.WARNING(f"{row['wo_number']}: {row['reason']}"))
+
+        finish = f"{schedule['finish']:%Y-%m-%d %H:%M}" if schedule['finish'] else '-'
+        verb = 'Would schedule' if options['dry_run'] else 'Scheduled'
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {schedule['scheduled']} work orders "
+            f"({schedule['in_progress']} in progress, {len(schedule['unscheduled'])} unscheduled), "
+            f"finishing {finish}; {schedule['changed']} with new dates"
+        ))
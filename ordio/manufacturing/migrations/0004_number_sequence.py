@@ -0,0 +1,42 @@
+# Generated by Django 4.2.24 on 2026-10-17 04:35
+
+from django.db import migrations, models
+
+
+def seed_sequences(apps, schema_editor):
+    """Start each counter after the highest number already issued for its prefix"""
+    NumberSequence = apps.get_model('manufacturing', 'NumberSequence')
+    ManufacturingOrder = apps.get_model('manufacturing', 'ManufacturingOrder')
+    StockAdjustment = apps.get_model('inventory', 'StockAdjustment')
+
+    last_values = {}
+    numbers = list(ManufacturingOrder.objects.values_list('mo_number', flat=True))
+    numbers += list(StockAdjustment.objects.values_list('adjustment_number', flat=True))
+    for number in numbers:
+        prefix, suffix = number[:-4], number[-4:]
+        if suffix.isdigit():
+            last_values[prefix] = max(last_values.get(prefix, 0), int(suffix))
+
+    NumberSequence.objects.bulk_create([
+        NumberSequence(prefix=prefix, last_value=last_value)
+        for prefix, last_value in last_values.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manufacturing', '0003_add_pause_tracking'),
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NumberSequence',
+            fields=[
+                ('prefix', models.CharField(max_length=20, primary_key=True, serialize=False)),
+                ('last_value', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
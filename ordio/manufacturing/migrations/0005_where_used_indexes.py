@@ -0,0 +1,17 @@
+# Generated by Django 4.2.24 on 2026-10-17 04:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manufacturing', '0004_number_sequence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='mocomponentrequirement',
+            index=models.Index(fields=['component', 'mo'], name='mo_requirement_where_used_idx'),
+        ),
+    ]
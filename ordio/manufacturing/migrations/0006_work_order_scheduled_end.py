@@ -0,0 +1,18 @@
+# Generated by Django 4.2.24 on 2026-10-17 04:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manufacturing', '0005_where_used_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workorder',
+            name='scheduled_end_date',
+            field=models.DateTimeField(blank=True, help_text='Planned finish from the capacity scheduler', null=True),
+        ),
+    ]
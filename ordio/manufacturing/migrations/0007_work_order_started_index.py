@@ -0,0 +1,17 @@
+# Generated by Django 4.2.24 on 2026-10-17 05:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manufacturing', '0006_work_order_scheduled_end'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workorder',
+            index=models.Index(fields=['actual_start_date', 'work_center'], name='wo_started_center_idx'),
+        ),
+    ]
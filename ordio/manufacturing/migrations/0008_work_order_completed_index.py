@@ -0,0 +1,17 @@
+# Generated by Django 4.2.24 on 2026-10-17 05:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manufacturing', '0007_work_order_started_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workorder',
+            index=models.Index(fields=['status', 'completion_date'], name='wo_status_completed_idx'),
+        ),
+    ]
@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, OuterRef
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from decimal import Decimal
@@ -7,6 +9,54 @@ import uuid
 
 User = get_user_model()
 
+DASHBOARD_VERSION_KEY = 'manufacturing:dashboard:version'
+
+# MO statuses whose component stock stays reserved
+RESERVING_STATUSES = ('CONFIRMED', 'IN_PROGRESS')
+
+
+def bump_dashboard_version():
+    """
+    Invalidate cached MO dashboards by moving to a new data version.
+
+    Only workers sharing the cache see the bump, so multi-process
+    deployments need a shared CACHES backend (see settings); with the
+    per-process LocMemCache other workers serve their snapshot until
+    DASHBOARD_CACHE_TIMEOUT expires.
+    """
+    try:
+        cache.incr(DASHBOARD_VERSION_KEY)
+    except ValueError:
+        cache.set(DASHBOARD_VERSION_KEY, 1, None)
+
+
+class NumberSequence(models.Model):
+    """
+    Counter row per document prefix (e.g. 'MO202509') used to allocate
+    human-readable numbers without scanning existing documents
+    """
+    prefix = models.CharField(max_length=20, primary_key=True)
+    last_value = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.prefix}: {self.last_value}"
+    
+    @classmethod
+    def allocate(cls, prefix, count=1):
+        """Reserve ``count`` consecutive numbers for ``prefix`` and return the first"""
+        with transaction.atomic():
+            cls.objects.bulk_create([cls(prefix=prefix)], ignore_conflicts=True)
+            # The UPDATE takes the row lock, so concurrent callers serialize here
+            cls.objects.filter(prefix=prefix).update(last_value=F('last_value') + count)
+            last_value = cls.objects.filter(prefix=prefix).values_list('last_value', flat=True).get()
+        return last_value - count + 1
+    
+    @classmethod
+    def next_number(cls, prefix):
+        """Allocate the next number for ``prefix`` formatted as <prefix><NNNN>"""
+        return f'{prefix}{cls.allocate(prefix):04d}'
+
+
 class ManufacturingOrder(models.Model):
     """
     Manufacturing Order - Authorization to produce a specific quantity of goods
@@ -68,34 +118,57 @@ class ManufacturingOrder(models.Model):
     def __str__(self):
         return f"MO-{self.mo_number}: {self.quantity_to_produce}x {self.product.name}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded status so save() can tell when it changes
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+    
     def save(self, *args, **kwargs):
         if not self.mo_number:
             self.mo_number = self.generate_mo_number()
+        status_changed = self._state.adding or self.status != getattr(self, '_loaded_status', None)
         super().save(*args, **kwargs)
+        
+        if status_changed:
+            self._loaded_status = self.status
+            transaction.on_commit(bump_dashboard_version)
+            # Only confirmed and in-progress orders hold stock; one sent back
+            # to draft, finished or canceled gives its reservations up
+            if self.status not in RESERVING_STATUSES:
+                from inventory.models import StockReservation
+                StockReservation.release_for_mo(self)
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(bump_dashboard_version)
+        return result
     
     def generate_mo_number(self):
         """Generate unique MO number"""
         from datetime import datetime
         date_str = datetime.now().strftime('%Y%m')
-        last_mo = ManufacturingOrder.objects.filter(
-            mo_number__startswith=f'MO{date_str}'
-        ).order_by('mo_number').last()
-        
-        if last_mo:
-            last_num = int(last_mo.mo_number[-4:])
-            new_num = last_num + 1
-        else:
-            new_num = 1
-            
-        return f'MO{date_str}{new_num:04d}'
+        return NumberSequence.next_number(f'MO{date_str}')
+    
+    def requirements_with_availability(self):
+        """
+        Component requirements with available-to-promise stock; reuses a
+        prefetched, annotated cache or loads them in one query
+        """
+        if 'component_requirements' in getattr(self, '_prefetched_objects_cache', {}):
+            return self.component_requirements.all()
+        return MOComponentRequirement.with_availability(
+            self.component_requirements.select_related('component')
+        )
     
     def get_required_components(self):
         """Get component requirements from stored MO components"""
         components = []
-        for mo_comp in self.component_requirements.all():
-            # Get current stock availability
-            current_stock = mo_comp.component.current_stock
-            shortage = max(0, mo_comp.required_quantity - current_stock)
+        for mo_comp in self.requirements_with_availability():
+            # Stock not already promised to other MOs
+            available_stock = mo_comp.available
+            shortage = max(0, mo_comp.remaining_quantity - available_stock)
             
             components.append({
                 'component_id': mo_comp.component.product_id,
@@ -103,19 +176,15 @@ class ManufacturingOrder(models.Model):
                 'component_sku': mo_comp.component.sku,
                 'quantity_per_unit': mo_comp.quantity_per_unit,
                 'required_quantity': mo_comp.required_quantity,
-                'available_stock': current_stock,
+                'available_stock': available_stock,
                 'shortage': shortage,
-                'is_sufficient': current_stock >= mo_comp.required_quantity
+                'is_sufficient': mo_comp.is_satisfied
             })
         return components
     
     def check_component_availability(self):
-        """Check if all components are available"""
-        for mo_comp in self.component_requirements.all():
-            current_stock = mo_comp.component.current_stock
-            if current_stock < mo_comp.required_quantity:
-                return False
-        return True
+        """Check if all components are available (after other MOs' reservations)"""
+        return all(req.is_satisfied for req in self.requirements_with_availability())
     
     def get_total_estimated_cost(self):
         """Calculate total estimated cost for this MO"""
@@ -126,41 +195,56 @@ class ManufacturingOrder(models.Model):
         if self.status != 'CONFIRMED':
             raise ValidationError("MO must be confirmed to create work orders")
         
-        # Delete existing work orders if any
-        self.work_orders.all().delete()
-        
-        for bom_op in self.bom.operations.all():
-            WorkOrder.objects.create(
-                mo=self,
-                bom_operation=bom_op,
-                name=bom_op.name,
-                work_center=bom_op.work_center,
-                estimated_duration_minutes=bom_op.get_total_time_minutes(self.quantity_to_produce),
-                sequence=bom_op.sequence
-            )
+        with transaction.atomic():
+            # Delete existing work orders if any
+            self.work_orders.all().delete()
+            
+            # Numbers are precomputed so the rows can be inserted in one batch
+            WorkOrder.objects.bulk_create([
+                WorkOrder(
+                    mo=self,
+                    bom_operation=bom_op,
+                    wo_number=f"{self.mo_number}-{bom_op.sequence:02d}",
+                    name=bom_op.name,
+                    work_center_id=bom_op.work_center_id,
+                    estimated_duration_minutes=bom_op.get_total_time_minutes(self.quantity_to_produce),
+                    sequence=bom_op.sequence
+                )
+                for bom_op in self.bom.operations.all()
+            ])
     
     def get_progress_percentage(self):
         """Calculate MO progress based on completed work orders"""
-        work_orders = self.work_orders.all()
+        # Count in Python so a prefetched work_orders cache is reused
+        work_orders = list(self.work_orders.all())
         if not work_orders:
             return 0
         
-        completed = work_orders.filter(status='COMPLETED').count()
-        return (completed / work_orders.count()) * 100
+        completed = sum(1 for wo in work_orders if wo.status == 'COMPLETED')
+        return (completed / len(work_orders)) * 100
     
     def populate_components_from_bom(self):
-        """Populate component requirements from BOM"""
-        # Clear existing components
-        self.component_requirements.all().delete()
+        """
+        Populate component requirements from the BOM's direct lines.
         
-        # Add components from BOM
-        for bom_comp in self.bom.components.all():
-            MOComponentRequirement.objects.create(
-                mo=self,
-                component=bom_comp.component,
-                quantity_per_unit=bom_comp.quantity,
-                required_quantity=bom_comp.quantity * self.quantity_to_produce
-            )
+        Sub-assemblies stay single requirement lines: they are built by their
+        own MOs, which carry their components. The flattened raw material
+        view is BOMExplosion (the BOM explode endpoint).
+        """
+        with transaction.atomic():
+            # Clear existing components
+            self.component_requirements.all().delete()
+            
+            # Add components from BOM
+            MOComponentRequirement.objects.bulk_create([
+                MOComponentRequirement(
+                    mo=self,
+                    component_id=bom_comp.component_id,
+                    quantity_per_unit=bom_comp.quantity,
+                    required_quantity=bom_comp.quantity * self.quantity_to_produce
+                )
+                for bom_comp in self.bom.components.all()
+            ])
     
     def can_start(self):
         """Check if MO can be started"""
@@ -206,6 +290,10 @@ class MOComponentRequirement(models.Model):
     class Meta:
         unique_together = [['mo', 'component']]
         ordering = ['component__name']
+        indexes = [
+            # Where-used lookups go component -> MO; the unique index leads with mo
+            models.Index(fields=['component', 'mo'], name='mo_requirement_where_used_idx'),
+        ]
     
     def __str__(self):
         return f"{self.mo.mo_number} - {self.component.name}: {self.required_quantity}"
@@ -215,10 +303,37 @@ class MOComponentRequirement(models.Model):
         """Quantity still needed"""
         return self.required_quantity - self.consumed_quantity
     
+    @classmethod
+    def with_availability(cls, queryset):
+        """
+        Annotate ``available_quantity``: the component's on-hand stock less
+        what other MOs have reserved, computed in the same query
+        """
+        from inventory.models import StockReservation
+        return queryset.annotate(
+            available_quantity=F('component__current_stock') - StockReservation.reserved_total(
+                OuterRef('component_id'), exclude_mo=OuterRef('mo_id')
+            )
+        )
+    
+    @property
+    def available(self):
+        """
+        Available-to-promise for this requirement (stock not reserved by other
+        MOs). Rows loaded through ``with_availability`` carry it already; for
+        others it is queried once and kept on the instance.
+        """
+        if not hasattr(self, 'available_quantity'):
+            from inventory.models import StockReservation
+            self.available_quantity = StockReservation.available_for(
+                [self.component_id], exclude_mo=self.mo_id
+            )[self.component_id]
+        return self.available_quantity
+    
     @property
     def is_satisfied(self):
         """Check if requirement is fully satisfied"""
-        return self.component.current_stock >= self.remaining_quantity
+        return self.available >= self.remaining_quantity
 
 
 class WorkOrder(models.Model):
@@ -262,6 +377,7 @@ class WorkOrder(models.Model):
     
     # Dates and tracking
     scheduled_start_date = models.DateTimeField(blank=True, null=True)
+    scheduled_end_date = models.DateTimeField(blank=True, null=True, help_text="Planned finish from the capacity scheduler")
     actual_start_date = models.DateTimeField(blank=True, null=True)
     completion_date = models.DateTimeField(blank=True, null=True)
     pause_start_time = models.DateTimeField(blank=True, null=True, help_text="When work was paused")
@@ -281,6 +397,10 @@ class WorkOrder(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['operator']),
             models.Index(fields=['work_center']),
+            # Utilization windows: work started in a date range, per center
+            models.Index(fields=['actual_start_date', 'work_center'], name='wo_started_center_idx'),
+            # Efficiency analytics: completed work in a date range
+            models.Index(fields=['status', 'completion_date'], name='wo_status_completed_idx'),
         ]
     
     def __str__(self):
@@ -293,7 +413,7 @@ class WorkOrder(models.Model):
     
     def generate_wo_number(self):
         """Generate unique WO number"""
-        mo_num = self.mo.mo_number if self.mo else "000000"
+        mo_num = self.mo.mo_number if self.mo_id else "000000"
         return f"{mo_num}-{self.sequence:02d}"
     
     def start_work(self, operator=None):
@@ -379,25 +499,21 @@ class WorkOrder(models.Model):
         # Clear pause tracking
         self.pause_start_time = None
         
-        self.save()
-        
-        # Check if all WOs are complete to update MO status
-        pending_wos = self.mo.work_orders.filter(status__in=['PENDING', 'IN_PROGRESS', 'PAUSED'])
-        if pending_wos.count() == 0:
-            # All work orders completed - complete the MO
-            self.mo.status = 'DONE'
-            self.mo.completion_date = timezone.now()
-            self.mo.quantity_produced = self.mo.quantity_to_produce
-            self.mo.save()
+        with transaction.atomic():
+            self.save()
             
-            # Process inventory movements
-            try:
+            # Check if all WOs are complete to update MO status
+            pending_wos = self.mo.work_orders.filter(status__in=['PENDING', 'IN_PROGRESS', 'PAUSED'])
+            if not pending_wos.exists():
+                # Consume components and produce goods before closing the MO;
+                # a shortage raises ValueError and rolls back this work order too
                 from inventory.models import StockOperations
                 StockOperations.complete_manufacturing_order(self.mo)
-            except Exception as e:
-                # Log the error but don't prevent MO completion
-                import logging
-                logging.error(f"Error processing inventory for MO {self.mo.mo_number}: {e}")
+                
+                self.mo.status = 'DONE'
+                self.mo.completion_date = timezone.now()
+                self.mo.quantity_produced = self.mo.quantity_to_produce
+                self.mo.save()
     
     def get_efficiency_percentage(self):
         """Calculate efficiency based on estimated vs actual time"""
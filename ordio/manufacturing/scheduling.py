@@ -0,0 +1,306 @@
+"""
+Finite-capacity forward scheduling of work orders.
+
+Each work center processes one work order at a time during a daily shift of
+``capacity_hours_per_day`` hours starting at SHIFT_START_HOUR (earlier if
+the shift would run past midnight); work that does not fit in a day carries
+over into the next day's shift. Within an MO, work orders run in
+``sequence`` order: every work order waits for all work orders of the MO
+with a lower sequence, while work orders sharing a sequence may run in
+parallel. No MO starts before its ``scheduled_start_date``.
+
+Scheduling is event driven: a priority queue holds each work center's next
+possible start, and the earliest one is taken next. When a work center frees
+up it runs, of the work orders ready by then, the one from the MO with the
+highest priority, then earliest scheduled date, then lowest MO number; when
+none is ready it idles until the first one is. Each work order passes
+through a handful of heap operations, so the run is O(n log n) over data
+loaded with two queries.
+"""
+import heapq
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from workcenters.models import WorkCenter
+from .models import WorkOrder
+
+SHIFT_START_HOUR = 8
+MINUTES_PER_DAY = 24 * 60
+
+SCHEDULED_MO_STATUSES = ['CONFIRMED', 'IN_PROGRESS']
+ACTIVE_WO_STATUSES = ['IN_PROGRESS', 'PAUSED']
+PRIORITY_RANKS = {'HIGH': 0, 'MEDIUM': 1, 'LOW': 2}
+
+# Work orders per UPDATE when saving a schedule
+SAVE_BATCH_SIZE = 1000
+
+
+class ShiftCalendar:
+    """
+    Maps between calendar minutes and working minutes for one daily shift.
+
+    Both count from midnight of the schedule's first day. Working minute
+    ``w`` is the ``w``-th minute of shift time since then.
+    """
+
+    def __init__(self, capacity_minutes):
+        self.capacity = min(capacity_minutes, MINUTES_PER_DAY)
+        self.shift_start = min(SHIFT_START_HOUR * 60, MINUTES_PER_DAY - self.capacity)
+
+    def to_working(self, minute):
+        """First working minute at or after calendar ``minute``"""
+        day, offset = divmod(minute, MINUTES_PER_DAY)
+        if offset < self.shift_start:
+            return day * self.capacity
+        if offset >= self.shift_start + self.capacity:
+            return (day + 1) * self.capacity
+        return day * self.capacity + offset - self.shift_start
+
+    def start_at(self, working_minute):
+        """Calendar minute at which work starting at ``working_minute`` begins"""
+        day, offset = divmod(working_minute, self.capacity)
+        return day * MINUTES_PER_DAY + self.shift_start + offset
+
+    def end_at(self, working_minute):
+        """Calendar minute at which work ending at ``working_minute`` finishes"""
+        if working_minute and not working_minute % self.capacity:
+            # Finishes exactly at the end of a shift, not the next morning
+            return self.start_at(working_minute - 1) + 1
+        return self.start_at(working_minute)
+
+
+def _remaining_minutes(status, estimated, worked, session_start, now):
+    """Estimated minutes left on an in-progress or paused work order"""
+    if status == 'IN_PROGRESS' and session_start:
+        worked += int((now - session_start).total_seconds() // 60)
+    return max(estimated - worked, 0)
+
+
+def build_schedule(start=None):
+    """
+    Forward-schedule every pending work order of confirmed and in-progress MOs.
+
+    In-progress and paused work orders are assumed to resume at ``start``
+    (default: now) and hold their work center for their remaining estimated
+    time. Work orders at an inactive work center or one without capacity
+    cannot be placed; they and every later work order of their MO are
+    reported as unscheduled.
+
+    Returns ``work_orders``: ``{wo_id: (start, end)}`` for every pending or
+    active work order that could be placed, ``unscheduled``: the ones that
+    could not, ``changes``: the new dates of every work order whose saved
+    dates differ, and per-work-center and overall totals.
+    """
+    now = timezone.now()
+    start = timezone.localtime(start or now)
+    base = timezone.make_aware(datetime.combine(start.date(), time.min), start.tzinfo)
+    origin = -(-int((start - base).total_seconds()) // 60)
+
+    rows = list(
+        WorkOrder.objects.filter(
+            mo__status__in=SCHEDULED_MO_STATUSES,
+            status__in=['PENDING', *ACTIVE_WO_STATUSES],
+        ).order_by('mo_id', 'sequence').values_list(
+            'wo_id', 'wo_number', 'mo_id', 'work_center_id', 'sequence', 'status',
+            'estimated_duration_minutes', 'actual_duration_minutes', 'actual_start_date',
+            'mo__priority', 'mo__scheduled_start_date', 'mo__mo_number',
+            'scheduled_start_date', 'scheduled_end_date',
+        )
+    )
+
+    calendars = {}
+    by_capacity = {}
+    for work_center_id, capacity_hours, is_active in WorkCenter.objects.filter(
+        pk__in={row[3] for row in rows}
+    ).values_list('work_center_id', 'capacity_hours_per_day', 'is_active'):
+        capacity = int(capacity_hours * 60)
+        if is_active and capacity > 0:
+            # Work centers with the same shift share one calendar
+            calendars[work_center_id] = by_capacity.setdefault(capacity, ShiftCalendar(capacity))
+
+    # mo_id -> [[row index, ...] per sequence, in order]
+    groups = defaultdict(list)
+    last_sequence = {}
+    for index, row in enumerate(rows):
+        mo_id, sequence = row[2], row[4]
+        if last_sequence.get(mo_id) != sequence:
+            groups[mo_id].append([])
+            last_sequence[mo_id] = sequence
+        groups[mo_id][-1].append(index)
+
+    free = defaultdict(int)  # work center -> working minute it is next free
+    busy = defaultdict(int)  # work center -> scheduled minutes
+    placed = {}              # row index -> (start minute, end minute)
+
+    # Work already under way holds its work center from the start
+    for index, row in enumerate(rows):
+        wo_status = row[5]
+        if wo_status not in ACTIVE_WO_STATUSES:
+            continue
+        remaining = _remaining_minutes(wo_status, row[6], row[7], row[8], now)
+        calendar = calendars.get(row[3])
+        if calendar is None:
+            placed[index] = (origin, origin + remaining)
+            continue
+        begin = max(free[row[3]], calendar.to_working(origin))
+        free[row[3]] = begin + remaining
+        busy[row[3]] += remaining
+        placed[index] = (calendar.start_at(begin), calendar.end_at(begin + remaining))
+
+    unscheduled = []
+    # mo_id -> [index of current group, work orders left in it, latest end so far]
+    progress = {}
+    # Per work center: work orders waiting for their predecessors, by the
+    # working minute they become ready, and work orders ready to run, by priority
+    waiting = defaultdict(list)
+    ready_queue = defaultdict(list)
+    # (calendar minute, work center order, work center, version) of each
+    # work center's next possible start; superseded versions are skipped
+    events = []
+    versions = defaultdict(int)
+    center_order = {work_center_id: order for order, work_center_id in enumerate(calendars)}
+
+    def plan_next(work_center_id):
+        """Queue the work center's next possible start"""
+        if ready_queue[work_center_id]:
+            begin = free[work_center_id]
+        elif waiting[work_center_id]:
+            begin = max(free[work_center_id], waiting[work_center_id][0][0])
+        else:
+            return
+        versions[work_center_id] += 1
+        heapq.heappush(events, (
+            calendars[work_center_id].start_at(begin), center_order[work_center_id],
+            work_center_id, versions[work_center_id],
+        ))
+
+    def release(mo_id, group_index, ready):
+        """Queue the MO's next group once everything before it has finished"""
+        mo_groups = groups[mo_id]
+        while group_index < len(mo_groups):
+            group = mo_groups[group_index]
+            pending = [index for index in group if index not in placed]
+            blocked = [index for index in pending if rows[index][3] not in calendars]
+            if blocked:
+                for group in mo_groups[group_index:]:
+                    for index in group:
+                        if index not in placed:
+                            reason = 'work center unavailable' if index in blocked else 'waiting on unschedulable work order'
+                            unscheduled.append((index, reason))
+                return
+            # Active work orders in this group are already placed
+            ready = max([ready] + [placed[index][1] for index in group if index in placed])
+            if pending:
+                progress[mo_id] = [group_index, len(pending), ready]
+                for index in pending:
+                    work_center_id = rows[index][3]
+                    heapq.heappush(waiting[work_center_id], (
+                        calendars[work_center_id].to_working(ready), index
+                    ))
+                    plan_next(work_center_id)
+                return
+            group_index += 1
+
+    for mo_id, mo_groups in groups.items():
+        first = rows[mo_groups[0][0]]
+        mo_start = (first[10] - base.date()).days * MINUTES_PER_DAY
+        release(mo_id, 0, max(origin, mo_start))
+
+    while events:
+        _, _, work_center_id, version = heapq.heappop(events)
+        if version != versions[work_center_id]:
+            continue
+        calendar = calendars[work_center_id]
+        queued = waiting[work_center_id]
+        ready = ready_queue[work_center_id]
+        begin = free[work_center_id]
+        if not ready:
+            begin = max(begin, queued[0][0])
+        while queued and queued[0][0] <= begin:
+            index = heapq.heappop(queued)[1]
+            row = rows[index]
+            heapq.heappush(ready, (PRIORITY_RANKS.get(row[9], 1), row[10], row[11], row[4], index))
+        index = heapq.heappop(ready)[-1]
+
+        row = rows[index]
+        duration = row[6]
+        free[work_center_id] = begin + duration
+        busy[work_center_id] += duration
+        end_at = calendar.end_at(begin + duration)
+        placed[index] = (calendar.start_at(begin), end_at)
+
+        state = progress[row[2]]
+        state[1] -= 1
+        state[2] = max(state[2], end_at)
+        if not state[1]:
+            release(row[2], state[0] + 1, state[2])
+        plan_next(work_center_id)
+
+    def at(minute):
+        return base + timedelta(minutes=minute)
+
+    finish = defaultdict(int)
+    counts = defaultdict(int)
+    work_orders = {}
+    changes = {}
+    for index, (begin, end) in placed.items():
+        row = rows[index]
+        finish[row[3]] = max(finish[row[3]], end)
+        counts[row[3]] += 1
+        work_orders[row[0]] = dates = (at(begin), at(end))
+        if dates != row[12:14]:
+            changes[row[0]] = dates
+    for index, _ in unscheduled:
+        if rows[index][12:14] != (None, None):
+            changes[rows[index][0]] = (None, None)
+
+    return {
+        'start': start,
+        'finish': at(max(finish.values())) if finish else None,
+        'work_orders': work_orders,
+        'changes': changes,
+        'scheduled': sum(1 for index in placed if rows[index][5] == 'PENDING'),
+        'in_progress': sum(1 for index in placed if rows[index][5] != 'PENDING'),
+        'unscheduled': [
+            {'wo_id': rows[index][0], 'wo_number': rows[index][1], 'reason': reason}
+            for index, reason in sorted(unscheduled)
+        ],
+        'work_centers': [
+            {
+                'work_center_id': work_center_id,
+                'work_order_count': counts[work_center_id],
+                'scheduled_minutes': busy[work_center_id],
+                'finish': at(finish[work_center_id]),
+            }
+            for work_center_id in sorted(counts, key=str)
+        ],
+    }
+
+
+def reschedule_work_orders(start=None, dry_run=False):
+    """
+    Build a schedule and, unless ``dry_run``, save the scheduled start and
+    end of every work order whose dates changed; work orders that could not
+    be placed have their scheduled dates cleared.
+    """
+    schedule = build_schedule(start)
+    changes = schedule.pop('changes')
+    schedule['changed'] = len(changes)
+    if dry_run:
+        return schedule
+
+    # A reschedule usually moves a fraction of the work orders, so only
+    # those are written
+    with transaction.atomic():
+        WorkOrder.objects.bulk_update(
+            [
+                WorkOrder(wo_id=wo_id, scheduled_start_date=begin, scheduled_end_date=end)
+                for wo_id, (begin, end) in changes.items()
+            ],
+            ['scheduled_start_date', 'scheduled_end_date'],
+            batch_size=SAVE_BATCH_SIZE,
+        )
+    return schedule
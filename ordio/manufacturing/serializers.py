@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from django.db.models import Case, Count, F, FloatField, Q, Value, When
+from django.db.models.functions import Cast
 from .models import ManufacturingOrder, WorkOrder, MOComponentRequirement
 from bom.serializers import BOMListSerializer
 from products.serializers import ProductListSerializer
@@ -12,7 +14,7 @@ class MOComponentRequirementSerializer(serializers.ModelSerializer):
     
     component_name = serializers.CharField(source='component.name', read_only=True)
     component_sku = serializers.CharField(source='component.sku', read_only=True)
-    available_stock = serializers.DecimalField(source='component.current_stock', read_only=True, max_digits=10, decimal_places=2)
+    available_stock = serializers.DecimalField(source='available', read_only=True, max_digits=10, decimal_places=2)
     is_satisfied = serializers.BooleanField(read_only=True)
     remaining_quantity = serializers.DecimalField(read_only=True, max_digits=10, decimal_places=2)
     shortage = serializers.SerializerMethodField()
@@ -28,8 +30,8 @@ class MOComponentRequirementSerializer(serializers.ModelSerializer):
         read_only_fields = ['requirement_id', 'created_at', 'updated_at']
     
     def get_shortage(self, obj):
-        """Calculate shortage: max(0, required - available)"""
-        shortage = obj.required_quantity - obj.component.current_stock
+        """Calculate shortage: max(0, remaining - available)"""
+        shortage = obj.remaining_quantity - obj.available
         return max(0, shortage)
 
 class WorkOrderSerializer(serializers.ModelSerializer):
@@ -46,7 +48,7 @@ class WorkOrderSerializer(serializers.ModelSerializer):
             'wo_id', 'wo_number', 'name', 'work_center', 'work_center_name',
             'sequence', 'estimated_duration_minutes', 'actual_duration_minutes',
             'status', 'operator', 'operator_name', 'scheduled_start_date',
-            'actual_start_date', 'completion_date', 'notes', 'quality_notes',
+            'scheduled_end_date', 'actual_start_date', 'completion_date', 'notes', 'quality_notes',
             'created_at', 'updated_at', 'efficiency_percentage', 'is_overdue'
         ]
         read_only_fields = [
@@ -70,7 +72,10 @@ class ManufacturingOrderSerializer(serializers.ModelSerializer):
     created_by_name = serializers.CharField(source='created_by.username', read_only=True)
     
     work_orders = WorkOrderSerializer(many=True, read_only=True)
-    component_requirements = MOComponentRequirementSerializer(many=True, read_only=True)
+    # Annotated with availability in the same query (or the detail prefetch)
+    component_requirements = MOComponentRequirementSerializer(
+        source='requirements_with_availability', many=True, read_only=True
+    )
     progress_percentage = serializers.FloatField(source='get_progress_percentage', read_only=True)
     total_estimated_cost = serializers.FloatField(source='get_total_estimated_cost', read_only=True)
     component_availability_check = serializers.BooleanField(source='check_component_availability', read_only=True)
@@ -113,7 +118,7 @@ class ManufacturingOrderListSerializer(serializers.ModelSerializer):
     
     product_name = serializers.CharField(source='product.name', read_only=True)
     assignee_name = serializers.SerializerMethodField()
-    progress_percentage = serializers.FloatField(source='get_progress_percentage', read_only=True)
+    progress_percentage = serializers.SerializerMethodField()
     work_order_count = serializers.SerializerMethodField()
     
     class Meta:
@@ -124,9 +129,31 @@ class ManufacturingOrderListSerializer(serializers.ModelSerializer):
             'progress_percentage', 'work_order_count', 'created_at'
         ]
     
+    @staticmethod
+    def setup_queryset(queryset):
+        """Annotate work order counts and progress so rows need no extra queries"""
+        completed = Count('work_orders', filter=Q(work_orders__status='COMPLETED'))
+        return queryset.select_related('product', 'assignee').annotate(
+            work_order_count=Count('work_orders'),
+            completed_wo_count=completed,
+        ).annotate(
+            progress=Case(
+                When(work_order_count=0, then=Value(0.0)),
+                default=Cast(F('completed_wo_count'), FloatField()) * 100 / F('work_order_count'),
+                output_field=FloatField(),
+            )
+        )
+    
     def get_work_order_count(self, obj):
+        if hasattr(obj, 'work_order_count'):
+            return obj.work_order_count
         return obj.work_orders.count()
     
+    def get_progress_percentage(self, obj):
+        if hasattr(obj, 'progress'):
+            return obj.progress
+        return float(obj.get_progress_percentage())
+    
     def get_assignee_name(self, obj):
         """Return assignee username or None if not assigned"""
         return obj.assignee.username if obj.assignee else None
@@ -168,4 +195,10 @@ class WorkOrderActionSerializer(serializers.Serializer):
     operator = serializers.PrimaryKeyRelatedField(
         queryset=User.objects.filter(role__in=['OPERATOR', 'MANAGER']),
         required=False
-    )
\ No newline at end of file
+    )
+
+class RescheduleSerializer(serializers.Serializer):
+    """Serializer for rescheduling work orders"""
+    
+    start = serializers.DateTimeField(required=False, help_text="Schedule from this time (default: now)")
+    dry_run = serializers.BooleanField(default=False, help_text="Return the schedule without saving it")
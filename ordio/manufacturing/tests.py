@@ -0,0 +1,370 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from bom.models import BOM
+from products.models import Product
+from tests.factories import User, build_mo
+from workcenters.models import WorkCenter
+from .models import ManufacturingOrder, MOComponentRequirement, NumberSequence, WorkOrder
+
+
+class ManufacturingOrderQueryBudgetTest(TestCase):
+    """MO endpoints must run a fixed number of queries regardless of MO size"""
+
+    # MO (with BOM cost rollup) + work orders + components
+    DETAIL_QUERY_BUDGET = 3
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='manager', email='manager@example.com', password='x', role='MANAGER'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_retrieve_query_count_is_constant(self):
+        large_mo = build_mo(self.user, work_order_count=50, component_count=200, suffix='L')
+        small_mo = build_mo(self.user, work_order_count=1, component_count=1, suffix='S')
+
+        with self.assertNumQueries(self.DETAIL_QUERY_BUDGET):
+            response = self.client.get(f'/api/manufacturing-orders/{large_mo.mo_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['work_orders']), 50)
+        self.assertEqual(len(response.data['component_requirements']), 200)
+        self.assertEqual(response.data['progress_percentage'], 50.0)
+        self.assertTrue(response.data['component_availability_check'])
+        self.assertAlmostEqual(
+            response.data['total_estimated_cost'],
+            (200 * 2 * 1.5 + 50 * 10 / 60 * 30) * 5
+        )
+
+        with self.assertNumQueries(self.DETAIL_QUERY_BUDGET):
+            self.client.get(f'/api/manufacturing-orders/{small_mo.mo_id}/')
+
+    def test_update_query_count_is_constant(self):
+        # The update response re-reads requirements after DRF drops the
+        # prefetch; availability must still come from one annotated query
+        counts = []
+        for component_count in (1, 20):
+            mo = build_mo(self.user, work_order_count=2, component_count=component_count, suffix=str(component_count))
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.patch(
+                    f'/api/manufacturing-orders/{mo.pk}/', {'notes': 'Rush'}, format='json'
+                )
+            self.assertEqual(response.status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_list_query_count_is_constant(self):
+        build_mo(self.user, work_order_count=4, component_count=2, suffix='A')
+        build_mo(self.user, work_order_count=0, component_count=1, suffix='B')
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/manufacturing-orders/')
+        self.assertEqual(response.status_code, 200)
+
+        rows = {row['product_name']: row for row in response.data}
+        self.assertEqual(rows['TableA']['work_order_count'], 4)
+        self.assertEqual(rows['TableA']['progress_percentage'], 50.0)
+        self.assertEqual(rows['TableA']['assignee_name'], 'manager')
+        self.assertEqual(rows['TableB']['work_order_count'], 0)
+        self.assertEqual(rows['TableB']['progress_percentage'], 0)
+
+        for suffix in 'CDE':
+            build_mo(self.user, work_order_count=3, component_count=1, suffix=suffix)
+        with self.assertNumQueries(1):
+            self.client.get('/api/manufacturing-orders/')
+
+
+class ManufacturingOrderPopulationTest(TestCase):
+    """BOM lines are copied onto an MO with batched inserts"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='manager', email='manager@example.com', password='x'
+        )
+
+    def test_populate_and_create_work_orders_in_constant_queries(self):
+        mo = build_mo(self.user, work_order_count=30, component_count=60)
+        mo.status = 'CONFIRMED'
+
+        # savepoint, delete, read BOM lines, insert, release; SQLite may
+        # split the insert into a couple of batches
+        with CaptureQueriesContext(connection) as queries:
+            mo.populate_components_from_bom()
+            mo.create_work_orders()
+        self.assertLessEqual(len(queries), 12)
+
+        self.assertEqual(mo.component_requirements.count(), 60)
+        self.assertEqual(
+            list(mo.work_orders.values_list('wo_number', flat=True)[:2]),
+            [f'{mo.mo_number}-01', f'{mo.mo_number}-02']
+        )
+
+
+class DashboardTest(TestCase):
+    """Dashboard is one aggregate plus one list query, then served from cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='manager', email='manager@example.com', password='x'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_statistics_are_cached_until_a_status_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            mo = build_mo(self.user, work_order_count=2, component_count=1, suffix='A')
+            build_mo(self.user, work_order_count=2, component_count=1, suffix='B')
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/manufacturing-orders/dashboard/')
+        self.assertEqual(response.data['statistics']['total_mos'], 2)
+        self.assertEqual(response.data['statistics']['draft'], 2)
+        self.assertEqual(len(response.data['recent_orders']), 2)
+
+        with self.assertNumQueries(0):
+            self.client.get('/api/manufacturing-orders/dashboard/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mo.status = 'CONFIRMED'
+            mo.save()
+        response = self.client.get('/api/manufacturing-orders/dashboard/')
+        self.assertEqual(response.data['statistics']['draft'], 1)
+        self.assertEqual(response.data['statistics']['confirmed'], 1)
+
+
+class WorkOrderPaginationTest(TestCase):
+    """Work order lists page by cursor only when the client opts in"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='operator', email='operator@example.com', password='x'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        mo = build_mo(self.user, work_order_count=5, component_count=1)
+        # A third-digit sequence sorts before "-04" as a string
+        WorkOrder.objects.filter(mo=mo, sequence=2).update(sequence=100, wo_number=f'{mo.mo_number}-100')
+        build_mo(self.user, work_order_count=4, component_count=1, suffix='B')
+
+    def test_unpaginated_by_default(self):
+        response = self.client.get('/api/work-orders/')
+        self.assertEqual(len(response.data), 9)
+
+    def test_cursor_walks_every_row_once(self):
+        seen = []
+        url = '/api/work-orders/pending/?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(wo['wo_number'] for wo in response.data['results'])
+            url = response.data['next']
+        pending = sorted(
+            WorkOrder.objects.filter(status='PENDING'), key=lambda wo: (str(wo.mo_id), wo.sequence)
+        )
+        self.assertEqual(seen, [wo.wo_number for wo in pending])
+        self.assertEqual(len(seen), 4)
+
+
+class NumberSequenceTest(TestCase):
+    """Document numbers come from per-prefix counter rows"""
+
+    def test_allocate_is_sequential_per_prefix(self):
+        self.assertEqual(NumberSequence.next_number('MO202501'), 'MO2025010001')
+        self.assertEqual(NumberSequence.next_number('MO202501'), 'MO2025010002')
+        self.assertEqual(NumberSequence.allocate('MO202501', count=3), 3)
+        self.assertEqual(NumberSequence.next_number('MO202501'), 'MO2025010006')
+        self.assertEqual(NumberSequence.next_number('ADJ202501'), 'ADJ2025010001')
+
+
+class MRPTest(TestCase):
+    """MRP allocates shared stock by priority, then scheduled date"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='planner', email='planner@example.com', password='x'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_competing_orders_share_stock_in_priority_order(self):
+        # Each MO needs 10 of its own parts; make them all need one shared part
+        mos = [build_mo(self.user, work_order_count=0, component_count=1, suffix=s) for s in 'ABC']
+        shared = Product.objects.create(
+            name='Shared', sku='SHARED', current_stock=Decimal('25'), minimum_stock=Decimal('5')
+        )
+        for mo, priority, day in zip(mos, ['LOW', 'HIGH', 'HIGH'], [1, 9, 2]):
+            mo.priority = priority
+            mo.scheduled_start_date = date(2025, 5, day)
+            mo.save()
+            MOComponentRequirement.objects.create(
+                mo=mo, component=shared, quantity_per_unit=Decimal('2'), required_quantity=Decimal('10')
+            )
+        mos[1].component_requirements.filter(component=shared).update(consumed_quantity=Decimal('4'))
+
+        with self.assertNumQueries(2):
+            plan = self.client.get('/api/manufacturing-orders/mrp/').data
+
+        self.assertEqual(plan['open_mo_count'], 3)
+        row = next(row for row in plan['components'] if row['product_sku'] == 'SHARED')
+        self.assertEqual(row['gross_requirement'], Decimal('26'))
+        self.assertEqual(row['allocated'], Decimal('25'))
+        self.assertEqual(row['shortage'], Decimal('1'))
+        self.assertEqual(row['planned_quantity'], Decimal('6'))
+        self.assertEqual(row['replenishment'], 'BUY')
+
+        # HIGH on day 2, then HIGH on day 9 (6 outstanding); the LOW MO is short
+        self.assertEqual(
+            [(s['mo_number'], s['shortage']) for s in plan['mo_shortages']],
+            [(mos[0].mo_number, Decimal('1'))]
+        )
+
+        out = StringIO()
+        call_command('run_mrp', stdout=out)
+        self.assertIn('1 short components across 1 MOs', out.getvalue())
+
+    def test_reserved_stock_goes_to_its_confirmed_order(self):
+        low = build_mo(self.user, work_order_count=0, component_count=1, suffix='L')
+        high = build_mo(self.user, work_order_count=0, component_count=1, suffix='H')
+        glue = Product.objects.create(name='Glue', sku='GLUE', current_stock=Decimal('10'))
+        for mo in (low, high):
+            MOComponentRequirement.objects.create(
+                mo=mo, component=glue, quantity_per_unit=Decimal('2'), required_quantity=Decimal('10')
+            )
+        self.client.post(f'/api/manufacturing-orders/{low.pk}/confirm/')
+        high.priority = 'HIGH'
+        high.save()
+
+        plan = self.client.get('/api/manufacturing-orders/mrp/').data
+        self.assertEqual(
+            [(s['mo_number'], s['shortage']) for s in plan['mo_shortages']],
+            [(high.mo_number, Decimal('10'))]
+        )
+
+
+class WorkOrderSchedulingTest(TestCase):
+    """Work orders are placed in sequence, one at a time per work center, within shifts"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='scheduler', email='scheduler@example.com', password='x'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def build(self, suffix, priority, durations):
+        mo = build_mo(self.user, work_order_count=len(durations), component_count=0, suffix=suffix)
+        mo.status = 'CONFIRMED'
+        mo.priority = priority
+        mo.scheduled_start_date = date(2025, 6, 2)
+        mo.save()
+        for wo, duration in zip(mo.work_orders.order_by('sequence'), durations):
+            wo.status = 'PENDING'
+            wo.estimated_duration_minutes = duration
+            wo.save()
+        return mo
+
+    def test_reschedule_respects_capacity_sequence_and_priority(self):
+        low = self.build('L', 'LOW', [300])
+        high = self.build('H', 'HIGH', [300, 60])
+        shared = high.work_orders.get(sequence=1).work_center
+        low.work_orders.update(work_center=shared)
+        # The second step runs round the clock
+        WorkCenter.objects.filter(code='ASML').update(capacity_hours_per_day=Decimal('24'))
+        high.work_orders.filter(sequence=2).update(work_center=WorkCenter.objects.get(code='ASML'))
+
+        response = self.client.post(
+            '/api/work-orders/reschedule/', {'start': '2025-06-02T08:00:00Z'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['scheduled'], 3)
+        self.assertEqual(response.data['unscheduled'], [])
+
+        def window(mo, sequence):
+            wo = mo.work_orders.get(sequence=sequence)
+            return wo.scheduled_start_date.strftime('%d %H:%M'), wo.scheduled_end_date.strftime('%d %H:%M')
+
+        # HIGH goes first on the shared 8-hour center; LOW runs over into the next shift
+        self.assertEqual(window(high, 1), ('02 08:00', '02 13:00'))
+        self.assertEqual(window(low, 1), ('02 13:00', '03 10:00'))
+        # The second step waits for the first but not for the shift
+        self.assertEqual(window(high, 2), ('02 13:00', '02 14:00'))
+
+        # Nothing moved, so nothing is rewritten
+        response = self.client.post(
+            '/api/work-orders/reschedule/', {'start': '2025-06-02T08:00:00Z'}, format='json'
+        )
+        self.assertEqual(response.data['changed'], 0)
+
+        WorkCenter.objects.filter(pk=shared.pk).update(is_active=False)
+        out = StringIO()
+        call_command('schedule_work_orders', start='2025-06-02T08:00:00', dry_run=True, stdout=out)
+        self.assertIn('Would schedule 0 work orders (0 in progress, 3 unscheduled)', out.getvalue())
+        self.assertIn('3 with new dates', out.getvalue())
+        self.assertEqual(window(low, 1), ('02 13:00', '03 10:00'))
+
+
+class EfficiencyAnalyticsTest(TestCase):
+    """Efficiency trends are rolled up per key and period in one grouped query"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='analyst', email='analyst@example.com', password='x'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_trends_per_operator_work_center_and_operation(self):
+        mo = build_mo(self.user, work_order_count=3, component_count=0)
+        end = datetime(2025, 6, 2, 16, tzinfo=dt_timezone.utc)
+        # Estimated 50 each; completed Monday 2nd, Monday 2nd, Monday 9th
+        for sequence, actual, paused, completed, late_by in [
+            (1, 50, 0, end, 0), (2, 100, 50, end, 30), (3, 25, 25, end + timedelta(days=7), None),
+        ]:
+            WorkOrder.objects.filter(mo=mo, sequence=sequence).update(
+                status='COMPLETED', actual_duration_minutes=actual, total_pause_minutes=paused,
+                completion_date=completed,
+                scheduled_end_date=completed - timedelta(minutes=late_by) if late_by is not None else None,
+            )
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                '/api/work-orders/analytics/operators/?from=2025-06-01&to=2025-06-15&period=week'
+            )
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        self.assertEqual(data['periods'], [date(2025, 6, 2), date(2025, 6, 9)])
+        [series] = data['series']
+        self.assertEqual(series['label'], 'analyst')
+        self.assertEqual(series['work_orders'], [2, 1])
+        # 100 estimated over 150 worked; 150 worked of 200 on the clock
+        self.assertEqual(series['performance'], [66.67, 200.0])
+        self.assertEqual(series['availability'], [75.0, 50.0])
+        self.assertEqual(series['oee'], [50.0, 50.0])
+        self.assertEqual(series['on_time'], [50.0, None])
+        self.assertEqual(series['average_delay_minutes'], [30.0, None])
+        self.assertEqual(series['totals']['performance'], 85.71)
+
+        response = self.client.get(
+            '/api/work-orders/analytics/operations/?from=2025-06-01&to=2025-06-05&period=day'
+        )
+        self.assertEqual(len(response.data['series']), 2)
+        self.assertEqual(response.data['series'][0]['label'].split(' / ')[1], 'Table BOM')
+
+        center = mo.work_orders.first().work_center_id
+        response = self.client.get(
+            f'/api/work-orders/analytics/work-centers/?from=2025-06-01&to=2025-06-30&period=month&work_center={center}'
+        )
+        self.assertEqual(response.data['series'][0]['totals']['work_orders'], 3)
+
+        response = self.client.get('/api/work-orders/analytics/work-centers/?period=year')
+        self.assertEqual(response.status_code, 400)
@@ -6,14 +6,29 @@ from rest_framework.filters import SearchFilter, OrderingFilter
 from django.shortcuts import get_object_or_404
 from django.core.exceptions import ValidationError
 from django.utils import timezone
-from .models import ManufacturingOrder, WorkOrder, MOComponentRequirement
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Prefetch, Q
+from django.utils.dateparse import parse_date
+from datetime import timedelta
+from .models import (
+    ManufacturingOrder, WorkOrder, MOComponentRequirement, DASHBOARD_VERSION_KEY,
+    RESERVING_STATUSES
+)
 from .serializers import (
     ManufacturingOrderSerializer, ManufacturingOrderListSerializer,
     ManufacturingOrderCreateSerializer, WorkOrderSerializer,
     WorkOrderUpdateSerializer, ComponentRequirementSerializer,
-    WorkOrderActionSerializer, MOComponentRequirementSerializer
+    WorkOrderActionSerializer, MOComponentRequirementSerializer, RescheduleSerializer
 )
-from inventory.models import StockOperations
+from inventory.models import StockOperations, StockReservation
+from .analytics import DEFAULT_DAYS as ANALYTICS_DEFAULT_DAYS, efficiency_trends
+from .mrp import run_mrp
+from .scheduling import reschedule_work_orders
+
+# Seconds a dashboard snapshot may be served; progress of in-flight work
+# orders does not bump the version, so keep this short
+DASHBOARD_CACHE_TIMEOUT = 30
 
 class ManufacturingOrderViewSet(viewsets.ModelViewSet):
     """
@@ -26,6 +41,34 @@ class ManufacturingOrderViewSet(viewsets.ModelViewSet):
     ordering_fields = ['mo_number', 'created_at', 'scheduled_start_date']
     ordering = ['-created_at']
     
+    def get_queryset(self):
+        queryset = ManufacturingOrder.objects.all()
+        if self.action == 'list':
+            return ManufacturingOrderListSerializer.setup_queryset(queryset)
+        
+        # Detail serialization reads work orders and components; load them up
+        # front so the query count does not grow with MO size. BOM costs come
+        # from the cached rollup on the BOM row
+        return queryset.select_related(
+            'product', 'bom', 'assignee', 'created_by'
+        ).prefetch_related(
+            Prefetch(
+                'work_orders',
+                queryset=WorkOrder.objects.select_related('work_center', 'operator')
+            ),
+            Prefetch(
+                'component_requirements',
+                queryset=MOComponentRequirement.with_availability(
+                    MOComponentRequirement.objects.select_related('component')
+                )
+            ),
+        )
+    
+    def _refresh_reservations(self, mo):
+        """Re-reserve a confirmed MO's stock after its requirements changed"""
+        if mo.status in RESERVING_STATUSES:
+            StockReservation.reserve_for_mo(mo)
+    
     def get_serializer_class(self):
         if self.action == 'list':
             return ManufacturingOrderListSerializer
@@ -41,6 +84,7 @@ class ManufacturingOrderViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         instance = serializer.save()
+        instance = self.get_queryset().get(pk=instance.pk)
         
         # Return full MO data using the regular serializer
         response_serializer = ManufacturingOrderSerializer(instance, context={'request': request})
@@ -61,21 +105,35 @@ class ManufacturingOrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if not mo.check_component_availability():
+        try:
+            with transaction.atomic():
+                # Claims the components so later confirmations see them as taken
+                StockReservation.reserve_for_mo(mo)
+                mo.status = 'CONFIRMED'
+                mo.save()
+                mo.create_work_orders()
+        except ValueError as e:
             return Response(
-                {'error': 'Insufficient components available'},
+                {'error': f'Insufficient components available: {e}'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        mo.status = 'CONFIRMED'
-        mo.save()
-        mo.create_work_orders()
+        # Reload so the response does not serialize the stale prefetch cache
+        mo = self.get_queryset().get(pk=mo.pk)
         
         return Response({
             'message': 'MO confirmed and work orders created',
             'mo': ManufacturingOrderSerializer(mo, context={'request': request}).data
         })
     
+    @action(detail=False, methods=['get'])
+    def mrp(self, request):
+        """
+        Allocate stock across all open MOs by priority and scheduled date;
+        per-component shortages and planned replenishment
+        GET /api/manufacturing-orders/mrp/
+        """
+        return Response(run_mrp())
+    
     @action(detail=True, methods=['post'])
     def complete(self, request, pk=None):
         """
@@ -99,14 +157,16 @@ class ManufacturingOrderViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            # Process stock movements
-            movements = StockOperations.complete_manufacturing_order(mo)
-            
-            # Update MO status to DONE and set completion date
-            mo.status = 'DONE'
-            mo.completion_date = timezone.now()
-            mo.quantity_produced = mo.quantity_to_produce
-            mo.save(update_fields=['status', 'completion_date', 'quantity_produced'])
+            with transaction.atomic():
+                # Process stock movements
+                movements = StockOperations.complete_manufacturing_order(mo)
+                
+                # Update MO status to DONE and set completion date
+                mo.status = 'DONE'
+                mo.completion_date = timezone.now()
+                mo.quantity_produced = mo.quantity_to_produce
+                mo.save(update_fields=['status', 'completion_date', 'quantity_produced'])
+            mo = self.get_queryset().get(pk=mo.pk)
             
             return Response({
                 'message': 'MO completed successfully',
@@ -127,7 +187,7 @@ class ManufacturingOrderViewSet(viewsets.ModelViewSet):
         GET /api/manufacturing-orders/{id}/component_requirements/
         """
         mo = self.get_object()
-        requirements = mo.component_requirements.all()
+        requirements = mo.requirements_with_availability()
         serializer = MOComponentRequirementSerializer(requirements, many=True)
         return Response(serializer.data)
     
@@ -147,7 +207,12 @@ class ManufacturingOrderViewSet(viewsets.ModelViewSet):
         
         serializer = MOComponentRequirementSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save(mo=mo)
+            try:
+                with transaction.atomic():
+                    serializer.save(mo=mo)
+                    self._refresh_reservations(mo)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -178,7 +243,12 @@ class ManufacturingOrderViewSet(viewsets.ModelViewSet):
         partial = request.method == 'PATCH'
         serializer = MOComponentRequirementSerializer(component_req, data=request.data, partial=partial)
         if serializer.is_valid():
-            serializer.save()
+            try:
+                with transaction.atomic():
+                    serializer.save()
+                    self._refresh_reservations(mo)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
             return Response(serializer.data)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -200,13 +270,17 @@ class ManufacturingOrderViewSet(viewsets.ModelViewSet):
         
         try:
             component_req = mo.component_requirements.get(requirement_id=component_id)
-            component_req.delete()
-            return Response({'message': 'Component requirement removed'})
         except MOComponentRequirement.DoesNotExist:
             return Response(
                 {'error': 'Component requirement not found'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        with transaction.atomic():
+            component_req.delete()
+            # Dropping a requirement only frees stock, so this cannot fall short
+            self._refresh_reservations(mo)
+        return Response({'message': 'Component requirement removed'})
     
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
@@ -214,25 +288,34 @@ class ManufacturingOrderViewSet(viewsets.ModelViewSet):
         Get MO dashboard data
         GET /api/manufacturing-orders/dashboard/
         """
-        mos = ManufacturingOrder.objects.all()
+        # Cached per data version; MO status transitions bump the version
+        version = cache.get_or_set(DASHBOARD_VERSION_KEY, 1, None)
+        cache_key = f'manufacturing:dashboard:{version}'
+        data = cache.get(cache_key)
+        if data is not None:
+            return Response(data)
         
-        stats = {
-            'total_mos': mos.count(),
-            'draft': mos.filter(status='DRAFT').count(),
-            'confirmed': mos.filter(status='CONFIRMED').count(),
-            'in_progress': mos.filter(status='IN_PROGRESS').count(),
-            'completed': mos.filter(status='DONE').count(),
-            'canceled': mos.filter(status='CANCELED').count(),
-        }
+        stats = ManufacturingOrder.objects.aggregate(
+            total_mos=Count('pk'),
+            draft=Count('pk', filter=Q(status='DRAFT')),
+            confirmed=Count('pk', filter=Q(status='CONFIRMED')),
+            in_progress=Count('pk', filter=Q(status='IN_PROGRESS')),
+            completed=Count('pk', filter=Q(status='DONE')),
+            canceled=Count('pk', filter=Q(status='CANCELED')),
+        )
         
         # Recent MOs
-        recent_mos = mos[:10]
+        recent_mos = ManufacturingOrderListSerializer.setup_queryset(
+            ManufacturingOrder.objects.all()
+        )[:10]
         recent_data = ManufacturingOrderListSerializer(recent_mos, many=True).data
         
-        return Response({
+        data = {
             'statistics': stats,
-            'recent_orders': recent_data
-        })
+            'recent_orders': list(recent_data)
+        }
+        cache.set(cache_key, data, DASHBOARD_CACHE_TIMEOUT)
+        return Response(data)
 
 class WorkOrderViewSet(viewsets.ModelViewSet):
     """
@@ -244,6 +327,9 @@ class WorkOrderViewSet(viewsets.ModelViewSet):
     search_fields = ['wo_number', 'name', 'mo__mo_number']
     ordering_fields = ['wo_number', 'created_at', 'scheduled_start_date']
     ordering = ['mo', 'sequence']
+    # Keyset on the MO's id column, then numeric sequence; wo_number pads the
+    # sequence to two digits and would sort 100 before 11
+    cursor_ordering = ['mo_id', 'sequence', 'wo_id']
     
     def get_serializer_class(self):
         if self.action in ['update', 'partial_update']:
@@ -327,7 +413,7 @@ class WorkOrderViewSet(viewsets.ModelViewSet):
                     'message': 'Work order completed',
                     'wo': WorkOrderSerializer(wo).data
                 })
-            except ValidationError as e:
+            except (ValidationError, ValueError) as e:
                 return Response(
                     {'error': str(e)},
                     status=status.HTTP_400_BAD_REQUEST
@@ -335,6 +421,71 @@ class WorkOrderViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'])
+    def reschedule(self, request):
+        """
+        Forward-schedule pending work orders against work center capacity
+        POST /api/work-orders/reschedule/
+        """
+        serializer = RescheduleSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        dry_run = serializer.validated_data['dry_run']
+        schedule = reschedule_work_orders(
+            start=serializer.validated_data.get('start'), dry_run=dry_run
+        )
+        work_orders = schedule.pop('work_orders')
+        if dry_run:
+            # Nothing was saved, so return the proposed dates themselves
+            schedule['work_orders'] = [
+                {'wo_id': wo_id, 'scheduled_start_date': begin, 'scheduled_end_date': end}
+                for wo_id, (begin, end) in work_orders.items()
+            ]
+        return Response(schedule)
+    
+    def _efficiency_trends(self, request, dimension):
+        """Efficiency trend response for ?from=&to=&period= and an optional ?<dimension>= id"""
+        params = request.query_params
+        try:
+            date_to = parse_date(params['to']) if params.get('to') else timezone.localdate()
+            date_from = (
+                parse_date(params['from']) if params.get('from')
+                else date_to - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)
+            )
+            if date_from is None or date_to is None:
+                raise ValueError('from/to must be dates (YYYY-MM-DD)')
+            return Response(efficiency_trends(
+                dimension, date_from, date_to,
+                period=params.get('period', 'week'), key=params.get(dimension) or None,
+            ))
+        except (ValueError, ValidationError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    @action(detail=False, methods=['get'], url_path='analytics/operators')
+    def operator_trends(self, request):
+        """
+        Performance, availability, OEE and on-time trends per operator
+        GET /api/work-orders/analytics/operators/?from=&to=&period=day|week|month&operator={id}
+        """
+        return self._efficiency_trends(request, 'operator')
+    
+    @action(detail=False, methods=['get'], url_path='analytics/work-centers')
+    def work_center_trends(self, request):
+        """
+        Performance, availability, OEE and on-time trends per work center
+        GET /api/work-orders/analytics/work-centers/?from=&to=&period=day|week|month&work_center={id}
+        """
+        return self._efficiency_trends(request, 'work_center')
+    
+    @action(detail=False, methods=['get'], url_path='analytics/operations')
+    def operation_trends(self, request):
+        """
+        Performance, availability, OEE and on-time trends per BOM operation
+        GET /api/work-orders/analytics/operations/?from=&to=&period=day|week|month&operation={id}
+        """
+        return self._efficiency_trends(request, 'operation')
+    
     @action(detail=False, methods=['get'])
     def my_tasks(self, request):
         """
@@ -342,6 +493,11 @@ class WorkOrderViewSet(viewsets.ModelViewSet):
         GET /api/work-orders/my_tasks/
         """
         my_wos = WorkOrder.objects.filter(operator=request.user)
+        page = self.paginate_queryset(my_wos)
+        if page is not None:
+            serializer = WorkOrderSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = WorkOrderSerializer(my_wos, many=True)
         return Response(serializer.data)
     
@@ -352,5 +508,10 @@ class WorkOrderViewSet(viewsets.ModelViewSet):
         GET /api/work-orders/pending/
         """
         pending_wos = WorkOrder.objects.filter(status='PENDING')
+        page = self.paginate_queryset(pending_wos)
+        if page is not None:
+            serializer = WorkOrderSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = WorkOrderSerializer(pending_wos, many=True)
         return Response(serializer.data)
\ No newline at end of file
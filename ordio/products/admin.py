@@ -10,6 +10,12 @@ class ProductAdmin(admin.ModelAdmin):
     list_filter = ['product_type', 'is_active', 'created_at']
     search_fields = ['name', 'sku', 'description']
     readonly_fields = ['product_id', 'created_at', 'updated_at']
+    
+    def get_readonly_fields(self, request, obj=None):
+        # Existing stock only moves through the ledger (stock adjustments)
+        if obj is not None:
+            return self.readonly_fields + ['current_stock']
+        return self.readonly_fields
     ordering = ['name']
     
     fieldsets = (
@@ -0,0 +1,164 @@
+"""
+Bulk product import: chunked validation and upsert by SKU.
+"""
+import csv
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.db import IntegrityError, transaction
+
+from bom.models import BOM
+from inventory.models import StockLedger
+from .models import Product
+from .serializers import ProductImportSerializer
+
+IMPORT_CHUNK_SIZE = 1000
+# Attempts per chunk; a SKU inserted concurrently between the existing-SKU
+# lookup and the upsert makes a chunk fail, and a retry sees it as existing
+CHUNK_ATTEMPTS = 2
+
+# Columns an imported row may overwrite when its SKU already exists; only
+# the ones the row supplies are written. Stock is never overwritten; it only
+# moves through the ledger.
+UPSERT_FIELDS = [
+    'name', 'product_type', 'minimum_stock', 'unit_of_measure',
+    'unit_cost', 'description', 'is_active',
+]
+
+
+def read_rows(stream, file_format):
+    """Yield row dicts from a CSV or JSON text stream"""
+    if file_format == 'csv':
+        for row in csv.DictReader(stream):
+            # Blank cells fall back to the field defaults
+            yield {
+                key.strip(): value.strip()
+                for key, value in row.items()
+                if key and isinstance(value, str) and value.strip()
+            }
+    elif file_format == 'json':
+        rows = json.load(stream)
+        if not isinstance(rows, list):
+            raise ValueError('JSON import must be a list of product objects')
+        yield from rows
+    else:
+        raise ValueError(f'Unsupported import format: {file_format}')
+
+
+def chunked(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def upsert_chunk(valid, user=None):
+    """
+    Upsert one chunk of validated rows (``{sku: data}``) in a transaction.
+
+    Returns the number of SKUs that already existed.
+    """
+    with transaction.atomic():
+        existing = {
+            sku: (product_id, unit_cost)
+            for sku, product_id, unit_cost in Product.objects.filter(
+                sku__in=list(valid)
+            ).values_list('sku', 'product_id', 'unit_cost')
+        }
+
+        # Supplied update columns -> products
+        upserts = defaultdict(list)
+        opening_stock = []
+        repriced = []
+        for sku, data in valid.items():
+            data = dict(data)
+            initial_stock = data.pop('current_stock', 0)
+            product = Product(**data)
+            if sku in existing:
+                product.product_id, unit_cost = existing[sku]
+                if 'unit_cost' in data and product.unit_cost != unit_cost:
+                    repriced.append(product.product_id)
+            else:
+                product.created_by = user
+                if initial_stock:
+                    opening_stock.append((product, initial_stock))
+            supplied = tuple(field for field in UPSERT_FIELDS if field in data)
+            upserts[supplied].append(product)
+
+        for supplied, products in upserts.items():
+            Product.objects.bulk_create(
+                products,
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=[*supplied, 'updated_at'],
+            )
+        StockLedger.create_movements([
+            {
+                'product': product,
+                'quantity_change': quantity,
+                'movement_type': 'INITIAL_STOCK',
+                'reference_number': f'INIT-{product.sku}',
+                'created_by': user,
+            }
+            for product, quantity in opening_stock
+        ])
+        # The upsert bypasses Product.save(), so refresh BOM costs here
+        if repriced:
+            BOM.refresh_costs_for_components(repriced)
+
+    return len(existing)
+
+
+def import_products(rows, user=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Create or update products by SKU.
+
+    Rows are handled ``chunk_size`` at a time: each chunk is validated
+    without touching the database, existing SKUs are resolved with one
+    ``IN`` query, the products are upserted with one ``bulk_create`` per set
+    of supplied columns (an existing product only has the columns its row
+    supplies overwritten) and the opening stock of newly created products is
+    recorded as one batch of ``INITIAL_STOCK`` ledger entries; BOMs using a
+    product whose unit cost changed get their cost rollup refreshed in one
+    UPDATE. Invalid rows are skipped and reported with their 1-based row
+    number; when a SKU repeats, the last row wins. A chunk that keeps
+    colliding with concurrent writes is rolled back and each of its rows is
+    reported as an error.
+    """
+    result = {'created': 0, 'updated': 0, 'errors': []}
+    row_number = 0
+
+    for chunk in chunked(rows, chunk_size):
+        valid = {}
+        row_numbers = {}
+        for row in chunk:
+            row_number += 1
+            serializer = ProductImportSerializer(data=row)
+            if serializer.is_valid():
+                valid[serializer.validated_data['sku']] = serializer.validated_data
+                row_numbers[serializer.validated_data['sku']] = row_number
+            else:
+                result['errors'].append({'row': row_number, 'errors': serializer.errors})
+        if not valid:
+            continue
+
+        for attempt in range(CHUNK_ATTEMPTS):
+            try:
+                updated = upsert_chunk(valid, user)
+                break
+            except (IntegrityError, Product.DoesNotExist) as e:
+                error = e
+        else:
+            result['errors'].extend(
+                {'row': number, 'errors': {'non_field_errors': [f'Not imported: {error}']}}
+                for number in sorted(row_numbers.values())
+            )
+            continue
+
+        result['updated'] += updated
+        result['created'] += len(valid) - updated
+
+    return result
@@ -0,0 +1 @@
+# Commands module
\ No newline at end of file
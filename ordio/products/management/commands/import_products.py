@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from products.imports import IMPORT_CHUNK_SIZE, import_products, read_rows
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Create or update products by SKU from a CSV or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV (with a header row) or JSON list of products')
+        parser.add_argument(
+            '--file-format',
+            choices=['csv', 'json'],
+            help='Defaults to the file extension',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=IMPORT_CHUNK_SIZE,
+            help='Rows validated and upserted per batch',
+        )
+        parser.add_argument('--user', help='Username recorded as creator of new products')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['file_format'] or ('json' if path.lower().endswith('.json') else 'csv')
+
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['user']} not found")
+
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as stream:
+                result = import_products(
+                    read_rows(stream, file_format), user=user, chunk_size=options['chunk_size']
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for error in result['errors']:
+            self.stdout.write(self.style.WARNING(f"Row {error['row']}: {error['errors']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{result['created']} created, {result['updated']} updated, "
+            f"{len(result['errors'])} rejected"
+        ))
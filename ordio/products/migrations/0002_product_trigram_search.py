@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# Django renders icontains/istartswith on PostgreSQL as
+# UPPER(column::text) LIKE UPPER(...), so the trigram indexes are built on
+# the same expression to serve both the list search and autocomplete
+TRIGRAM_INDEXES = {
+    'product_name_trgm_idx': 'name',
+    'product_sku_trgm_idx': 'sku',
+    'product_description_trgm_idx': 'description',
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, column in TRIGRAM_INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON products_product '
+            f'USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+    """Trigram indexes backing product search on PostgreSQL (no-op elsewhere)"""
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
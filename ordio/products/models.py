@@ -60,6 +60,38 @@ class Product(models.Model):
     def __str__(self):
         return f"{self.name} ({self.sku})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded cost so save() can refresh BOM costs on change
+        instance._loaded_unit_cost = instance.__dict__.get('unit_cost')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        cost_changed = not self._state.adding and self.unit_cost != getattr(self, '_loaded_unit_cost', None)
+        # Stock only moves through the ledger's F() updates; an instance
+        # loaded before a movement must not write its stale balance back
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'current_stock'
+            ]
+        super().save(*args, **kwargs)
+        
+        if cost_changed:
+            from bom.models import BOM
+            BOM.refresh_costs_for_components([self.pk])
+            self._loaded_unit_cost = self.unit_cost
+    
+    def delete(self, *args, **kwargs):
+        # BOM lines using this product are removed by the cascade; refresh
+        # the BOMs that held them afterwards
+        from bom.models import BOM, BOMComponent
+        bom_ids = list(BOMComponent.objects.filter(component=self).values_list('bom_id', flat=True))
+        result = super().delete(*args, **kwargs)
+        BOM.refresh_costs(bom_ids)
+        return result
+    
     def is_low_stock(self):
         """Check if product stock is below minimum threshold"""
         return self.current_stock <= self.minimum_stock
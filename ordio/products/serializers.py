@@ -21,10 +21,31 @@ class ProductSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['product_id', 'created_at', 'updated_at', 'created_by_name', 'stock_status', 'is_low_stock']
     
+    def get_extra_kwargs(self):
+        extra_kwargs = super().get_extra_kwargs()
+        # Opening stock may be given on create; afterwards stock only moves
+        # through the ledger (stock adjustments, MO consumption/production)
+        if self.instance is not None:
+            extra_kwargs['current_stock'] = {'read_only': True}
+        return extra_kwargs
+    
     def create(self, validated_data):
         # Set created_by to current user
         validated_data['created_by'] = self.context['request'].user
-        return super().create(validated_data)
+        initial_stock = validated_data.pop('current_stock', 0)
+        product = super().create(validated_data)
+        
+        # Opening balance goes through the ledger so balances can be rebuilt from it
+        if initial_stock:
+            from inventory.models import StockLedger
+            StockLedger.create_movement(
+                product=product,
+                quantity_change=initial_stock,
+                movement_type='INITIAL_STOCK',
+                reference_number=f'INIT-{product.sku}',
+                created_by=validated_data['created_by']
+            )
+        return product
 
 class ProductListSerializer(serializers.ModelSerializer):
     """Simplified serializer for product lists"""
@@ -38,6 +59,24 @@ class ProductListSerializer(serializers.ModelSerializer):
             'unit_of_measure', 'stock_status', 'is_active'
         ]
 
+class ProductImportSerializer(serializers.ModelSerializer):
+    """
+    One row of a bulk product import. SKU uniqueness is not checked per row;
+    existing SKUs are resolved and updated by the importer in bulk.
+    """
+    
+    current_stock = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False, default=0
+    )
+    
+    class Meta:
+        model = Product
+        fields = [
+            'name', 'sku', 'product_type', 'current_stock', 'minimum_stock',
+            'unit_of_measure', 'unit_cost', 'description', 'is_active'
+        ]
+        extra_kwargs = {'sku': {'validators': []}}
+
 class ProductStockUpdateSerializer(serializers.Serializer):
     """Serializer for updating product stock"""
     
@@ -1,3 +1,179 @@
+from decimal import Decimal
+from io import StringIO
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import IntegrityError, connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from inventory.models import StockLedger
+from tests.factories import User
+from .imports import import_products, upsert_chunk
+from .models import Product
+
+
+class ProductImportTest(TestCase):
+    """Bulk import upserts by SKU with a per-chunk, not per-row, query cost"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='manager', email='manager@example.com', password='x'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_json_upsert_records_opening_stock(self):
+        Product.objects.create(name='Old bolt', sku='BOLT', current_stock=Decimal('4'))
+        rows = [{'name': 'Bolt', 'sku': 'BOLT', 'current_stock': '99', 'unit_cost': '0.10'}]
+        rows += [{'name': f'Part {i}', 'sku': f'P-{i}', 'current_stock': '5'} for i in range(300)]
+        rows.append({'name': 'No SKU'})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/products/import/', rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(len(queries), 20)
+        self.assertEqual(response.data['created'], 300)
+        self.assertEqual(response.data['updated'], 1)
+        self.assertEqual(response.data['errors'][0]['row'], 302)
+
+        bolt = Product.objects.get(sku='BOLT')
+        self.assertEqual(bolt.name, 'Bolt')
+        self.assertEqual(bolt.unit_cost, Decimal('0.10'))
+        self.assertEqual(bolt.current_stock, Decimal('4'))
+
+        part = Product.objects.get(sku='P-7')
+        self.assertEqual(part.current_stock, Decimal('5'))
+        self.assertEqual(part.created_by, self.user)
+        self.assertEqual(
+            StockLedger.objects.filter(movement_type='INITIAL_STOCK').count(), 300
+        )
+
+    def test_chunk_colliding_with_concurrent_insert_is_retried(self):
+        rows = [{'name': 'Bolt', 'sku': 'BOLT'}, {'name': 'Nut', 'sku': 'NUT'}]
+        attempts = []
+
+        def collide_once(*args):
+            # The first attempt loses the race to another writer of the SKU
+            attempts.append(args)
+            if len(attempts) == 1:
+                raise IntegrityError('duplicate key value violates unique constraint')
+            return upsert_chunk(*args)
+
+        with mock.patch('products.imports.upsert_chunk', side_effect=collide_once):
+            response = self.client.post('/api/products/import/', rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(len(attempts), 2)
+
+        with mock.patch('products.imports.upsert_chunk', side_effect=Product.DoesNotExist('gone')):
+            response = self.client.post('/api/products/import/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['row'] for error in response.data['errors']], [1, 2])
+
+    def test_partial_row_leaves_other_columns_untouched(self):
+        bolt = Product.objects.create(
+            name='Bolt', sku='BOLT', unit_cost=Decimal('3.50'), description='M8 hex',
+            minimum_stock=Decimal('20'), is_active=False
+        )
+        result = import_products([
+            {'sku': 'BOLT', 'name': 'Bolt M8'},
+            {'sku': 'NUT', 'name': 'Nut', 'unit_cost': '0.20'},
+        ])
+        self.assertEqual((result['created'], result['updated']), (1, 1))
+
+        bolt.refresh_from_db()
+        self.assertEqual(bolt.name, 'Bolt M8')
+        self.assertEqual(bolt.unit_cost, Decimal('3.50'))
+        self.assertEqual(bolt.description, 'M8 hex')
+        self.assertEqual(bolt.minimum_stock, Decimal('20'))
+        self.assertFalse(bolt.is_active)
+        self.assertEqual(Product.objects.get(sku='NUT').unit_cost, Decimal('0.20'))
+
+    def test_csv_upload(self):
+        upload = SimpleUploadedFile(
+            'catalog.csv',
+            b'sku,name,product_type,current_stock,minimum_stock\n'
+            b'WOOD,Oak plank,RAW_MATERIAL,12,\n'
+            b'TABLE,Table,FINISHED_GOOD,,\n',
+        )
+        response = self.client.post('/api/products/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.data, {'created': 2, 'updated': 0, 'errors': []})
+        self.assertEqual(Product.objects.get(sku='WOOD').current_stock, Decimal('12'))
+        self.assertEqual(Product.objects.get(sku='TABLE').product_type, 'FINISHED_GOOD')
+
+    def test_command_imports_in_chunks(self):
+        rows = [{'name': f'Screw {i}', 'sku': f'S-{i}'} for i in range(25)]
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as handle:
+            json.dump(rows, handle)
+        self.addCleanup(os.remove, handle.name)
+
+        out = StringIO()
+        call_command('import_products', handle.name, chunk_size=10, stdout=out)
+        self.assertIn('25 created, 0 updated, 0 rejected', out.getvalue())
+        self.assertEqual(Product.objects.filter(sku__startswith='S-').count(), 25)
+
+
+class ProductAutocompleteTest(TestCase):
+    """Autocomplete ranks SKU matches above name matches"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(username='picker', email='picker@example.com', password='x')
+        )
+        Product.objects.bulk_create([
+            Product(name='Hex bolt M8', sku='HB-M8'),
+            Product(name='Bolt cutter', sku='TOOL-1'),
+            Product(name='Carriage bolt', sku='BOLT'),
+            Product(name='Anchor', sku='BOLT-ANCHOR'),
+            Product(name='Boltless shelf', sku='SH-1', is_active=False),
+            Product(name='Washer', sku='W-1'),
+        ])
+
+    def test_ranked_matches(self):
+        response = self.client.get('/api/products/autocomplete/?q=bolt')
+        self.assertEqual(
+            [row['sku'] for row in response.data],
+            ['BOLT', 'BOLT-ANCHOR', 'TOOL-1', 'HB-M8']
+        )
+
+    def test_limit_and_short_terms(self):
+        response = self.client.get('/api/products/autocomplete/?q=bolt&limit=2')
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(self.client.get('/api/products/autocomplete/?q=b').data, [])
+
+
+class ProductStockWriteTest(TestCase):
+    """Product saves never write back a stale stock balance"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            User.objects.create_user(username='buyer', email='buyer@example.com', password='x')
+        )
+
+    def test_stale_instance_and_patch_keep_ledger_balance(self):
+        product = Product.objects.create(name='Glue', sku='GLUE', current_stock=Decimal('10'))
+        stale = Product.objects.get(pk=product.pk)
+        entry = StockLedger.create_movement(
+            product=product, quantity_change=Decimal('5'), movement_type='MANUAL_IN'
+        )
+        self.assertEqual((entry.stock_before, entry.stock_after), (Decimal('10'), Decimal('15')))
+
+        stale.unit_cost = Decimal('2.00')
+        stale.save()
+        response = self.client.patch(
+            f'/api/products/{product.pk}/', {'name': 'Wood glue', 'current_stock': '0'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
 
-# Create your tests here.
+        product.refresh_from_db()
+        self.assertEqual(product.current_stock, Decimal('15'))
+        self.assertEqual(product.unit_cost, Decimal('2.00'))
+        self.assertEqual(product.name, 'Wood glue')
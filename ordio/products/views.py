@@ -4,12 +4,42 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.filters import SearchFilter, OrderingFilter
 from django.db import models
+from django.db.models import Case, IntegerField, Q, Value, When
+import io
+from .imports import import_products, read_rows
 from .models import Product
 from .serializers import (
     ProductSerializer, ProductListSerializer, ProductStockUpdateSerializer
 )
 from inventory.models import StockLedger
 
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+AUTOCOMPLETE_FIELDS = ['product_id', 'name', 'sku', 'product_type', 'unit_of_measure', 'current_stock']
+
+
+def rank_product_matches(queryset, term):
+    """
+    Filter products whose name or SKU contains ``term`` and annotate a
+    ``rank``: exact SKU, SKU prefix, name prefix, name word prefix, anywhere.
+
+    On PostgreSQL the contains/prefix filters are served by the trigram
+    indexes on UPPER(name) and UPPER(sku); elsewhere they are plain LIKEs.
+    """
+    return queryset.filter(
+        Q(name__icontains=term) | Q(sku__icontains=term)
+    ).annotate(
+        rank=Case(
+            When(sku__iexact=term, then=Value(4)),
+            When(sku__istartswith=term, then=Value(3)),
+            When(name__istartswith=term, then=Value(2)),
+            When(name__icontains=f' {term}', then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    ).order_by('-rank', 'name')
+
+
 class ProductViewSet(viewsets.ModelViewSet):
     """
     ViewSet for Product CRUD operations
@@ -73,6 +103,54 @@ class ProductViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'], url_path='import')
+    def bulk_import(self, request):
+        """
+        Create or update products by SKU from a CSV/JSON upload or a JSON list
+        POST /api/products/import/
+        """
+        upload = request.FILES.get('file')
+        try:
+            if upload is not None:
+                file_format = 'json' if upload.name.lower().endswith('.json') else 'csv'
+                rows = read_rows(io.TextIOWrapper(upload.file, encoding='utf-8-sig'), file_format)
+            elif isinstance(request.data, list):
+                rows = request.data
+            else:
+                return Response(
+                    {'error': 'Send a list of products or upload a CSV/JSON file as "file"'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            result = import_products(rows, user=request.user)
+        except (ValueError, UnicodeDecodeError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        imported = result['created'] + result['updated']
+        return Response(
+            result,
+            status=status.HTTP_400_BAD_REQUEST if result['errors'] and not imported else status.HTTP_200_OK
+        )
+    
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        """
+        Top matches by name or SKU for product pickers, best match first
+        GET /api/products/autocomplete/?q={term}&limit={n}
+        """
+        term = request.query_params.get('q', '').strip()
+        try:
+            limit = min(int(request.query_params.get('limit', AUTOCOMPLETE_LIMIT)), AUTOCOMPLETE_MAX_LIMIT)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # One or two characters match most of a large catalog; wait for more
+        if len(term) < 2 or limit < 1:
+            return Response([])
+        
+        products = Product.objects.filter(is_active=True)
+        matches = rank_product_matches(products, term).values(*AUTOCOMPLETE_FIELDS, 'rank')[:limit]
+        return Response(list(matches))
+    
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
         """
@@ -83,6 +161,11 @@ class ProductViewSet(viewsets.ModelViewSet):
             current_stock__lte=models.F('minimum_stock'),
             is_active=True
         )
+        page = self.paginate_queryset(low_stock_products)
+        if page is not None:
+            serializer = ProductListSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = ProductListSerializer(low_stock_products, many=True)
         return Response(serializer.data)
     
@@ -122,6 +205,53 @@ class ProductViewSet(viewsets.ModelViewSet):
         serializer = ProductListSerializer(raw_materials, many=True)
         return Response(serializer.data)
     
+    @action(detail=True, methods=['get'])
+    def where_used(self, request, pk=None):
+        """
+        BOMs using this product up to N levels up, and open MOs consuming it
+        or any of those assemblies
+        GET /api/products/{id}/where_used/?levels={n}
+        """
+        product = self.get_object()
+        from bom.where_used import where_used
+        from manufacturing.models import MOComponentRequirement
+        try:
+            levels = int(request.query_params.get('levels', 1))
+        except ValueError:
+            return Response({'error': 'levels must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            usages, products = where_used(product.product_id, levels)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        open_mos = MOComponentRequirement.objects.filter(
+            component_id__in=products
+        ).exclude(
+            mo__status__in=['DONE', 'CANCELED']
+        ).values(
+            'mo_id', 'mo__mo_number', 'mo__status', 'mo__product__name',
+            'mo__scheduled_start_date', 'component_id', 'required_quantity', 'consumed_quantity'
+        ).order_by('mo__scheduled_start_date', 'mo__mo_number')
+        
+        return Response({
+            'product_id': product.product_id,
+            'levels': levels,
+            'boms': usages,
+            'open_mos': [
+                {
+                    'mo_id': row['mo_id'],
+                    'mo_number': row['mo__mo_number'],
+                    'status': row['mo__status'],
+                    'product_name': row['mo__product__name'],
+                    'scheduled_start_date': row['mo__scheduled_start_date'],
+                    'component_id': row['component_id'],
+                    'required_quantity': row['required_quantity'],
+                    'consumed_quantity': row['consumed_quantity'],
+                }
+                for row in open_mos
+            ]
+        })
+    
     @action(detail=True, methods=['get'])
     def stock_movements(self, request, pk=None):
         """
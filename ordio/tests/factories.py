@@ -0,0 +1,70 @@
+"""
+Test-only factories shared by the app test suites; not part of the
+deployed project package.
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+
+from bom.models import BOM, BOMComponent, BOMOperation
+from manufacturing.models import ManufacturingOrder, MOComponentRequirement, WorkOrder
+from products.models import Product
+from workcenters.models import WorkCenter
+
+User = get_user_model()
+
+
+def build_mo(user, work_order_count, component_count, suffix=''):
+    """Create an MO with the given number of work orders and components"""
+    product = Product.objects.create(
+        name=f'Table{suffix}', sku=f'FG{suffix}', product_type='FINISHED_GOOD'
+    )
+    work_center = WorkCenter.objects.create(
+        name=f'Assembly{suffix}', code=f'ASM{suffix}', cost_per_hour=Decimal('30.00')
+    )
+    bom = BOM.objects.create(product=product, name=f'Table BOM{suffix}', created_by=user)
+
+    components = Product.objects.bulk_create([
+        Product(
+            name=f'Part {suffix}{i}', sku=f'P{suffix}-{i}',
+            current_stock=Decimal('100.00'), unit_cost=Decimal('1.50')
+        )
+        for i in range(component_count)
+    ])
+    BOMComponent.objects.bulk_create([
+        BOMComponent(bom=bom, component=component, quantity=Decimal('2.00'))
+        for component in components
+    ])
+    operations = BOMOperation.objects.bulk_create([
+        BOMOperation(
+            bom=bom, name=f'Step {i}', sequence=i + 1,
+            work_center=work_center, duration_minutes=10
+        )
+        for i in range(work_order_count)
+    ])
+    # Bulk inserts skip the line save() hooks, so refresh the cost rollup
+    BOM.refresh_costs([bom.pk])
+
+    mo = ManufacturingOrder.objects.create(
+        product=product, bom=bom, quantity_to_produce=5,
+        scheduled_start_date=date.today(), assignee=user, created_by=user
+    )
+    MOComponentRequirement.objects.bulk_create([
+        MOComponentRequirement(
+            mo=mo, component=component,
+            quantity_per_unit=Decimal('2.00'), required_quantity=Decimal('10.00')
+        )
+        for component in components
+    ])
+    WorkOrder.objects.bulk_create([
+        WorkOrder(
+            mo=mo, bom_operation=operation, name=operation.name,
+            work_center=work_center, sequence=operation.sequence,
+            wo_number=f'{mo.mo_number}-{operation.sequence:02d}',
+            estimated_duration_minutes=50, operator=user,
+            status='COMPLETED' if operation.sequence % 2 else 'PENDING'
+        )
+        for operation in operations
+    ])
+    return mo
@@ -0,0 +1,118 @@
+"""
+Work center load projection: open work order minutes against capacity.
+
+Open work is bucketed by the day it is planned to start, its scheduled
+start when the capacity scheduler has placed it and its MO's scheduled
+start otherwise. All buckets for all work centers come from one grouped
+query; the result is returned as columns aligned to the bucket list so a
+planning board can draw it without reshaping.
+"""
+from datetime import timedelta
+
+from django.db.models import Case, DateField, F, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, TruncDate, TruncWeek
+
+from manufacturing.models import WorkOrder
+from .models import WorkCenter
+
+BUCKETS = ('day', 'week')
+DEFAULT_WEEKS = 4
+# Longest range one request may cover
+MAX_DAYS = 366
+
+OPEN_WO_STATUSES = ['PENDING', 'IN_PROGRESS', 'PAUSED']
+CLOSED_MO_STATUSES = ['DONE', 'CANCELED']
+
+
+def bucket_start(day, bucket):
+    """First day of the bucket containing ``day`` (weeks start on Monday)"""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def work_center_load(date_from, date_to, bucket='day'):
+    """
+    Planned open work order minutes per active work center and bucket
+    between ``date_from`` and ``date_to`` (inclusive).
+
+    Work started but not finished counts only its estimate not yet booked.
+    Open work planned before ``date_from`` is late; it is reported per work
+    center as ``backlog_minutes`` rather than dropped.
+    """
+    if bucket not in BUCKETS:
+        raise ValueError(f"bucket must be one of: {', '.join(BUCKETS)}")
+    if date_to < date_from:
+        raise ValueError('to must not be before from')
+    if (date_to - date_from).days >= MAX_DAYS:
+        raise ValueError(f'The range may cover at most {MAX_DAYS} days')
+
+    # Bucket labels and how many days of the range each covers
+    buckets = []
+    bucket_days = []
+    day = date_from
+    while day <= date_to:
+        start = bucket_start(day, bucket)
+        if not buckets or buckets[-1] != start:
+            buckets.append(start)
+            bucket_days.append(0)
+        bucket_days[-1] += 1
+        day += timedelta(days=1)
+    positions = {start: index for index, start in enumerate(buckets)}
+
+    centers = list(
+        WorkCenter.objects.filter(is_active=True).order_by('code').values_list(
+            'work_center_id', 'code', 'name', 'capacity_hours_per_day'
+        )
+    )
+    rows = {work_center_id: index for index, (work_center_id, *_) in enumerate(centers)}
+    load = [[0] * len(buckets) for _ in centers]
+    backlog = [0] * len(centers)
+
+    planned_day = Coalesce(TruncDate('scheduled_start_date'), F('mo__scheduled_start_date'))
+    in_range = planned_day if bucket == 'day' else TruncWeek(planned_day, output_field=DateField())
+    # Late work gets no bucket
+    planned_bucket = Case(
+        When(planned_day__lt=date_from, then=Value(None, output_field=DateField())),
+        default=in_range,
+        output_field=DateField(),
+    )
+    totals = WorkOrder.objects.filter(
+        status__in=OPEN_WO_STATUSES,
+        work_center__is_active=True,
+    ).exclude(
+        mo__status__in=CLOSED_MO_STATUSES,
+    ).annotate(
+        planned_day=planned_day,
+    ).filter(
+        planned_day__lte=date_to,
+    ).values('work_center_id', planned_bucket=planned_bucket).annotate(
+        minutes=Sum(Greatest(F('estimated_duration_minutes') - F('actual_duration_minutes'), Value(0))),
+    ).order_by().values_list('work_center_id', 'planned_bucket', 'minutes')
+
+    for work_center_id, start, minutes in totals:
+        if start is None:
+            backlog[rows[work_center_id]] += minutes
+        else:
+            load[rows[work_center_id]][positions[start]] += minutes
+
+    daily_capacity = [float(capacity_hours) * 60 for *_, capacity_hours in centers]
+    return {
+        'from': date_from,
+        'to': date_to,
+        'bucket': bucket,
+        'buckets': buckets,
+        'bucket_days': bucket_days,
+        'work_centers': {
+            'work_center_id': [center[0] for center in centers],
+            'code': [center[1] for center in centers],
+            'name': [center[2] for center in centers],
+            'daily_capacity_minutes': daily_capacity,
+            'backlog_minutes': backlog,
+        },
+        # One row per work center, one column per bucket
+        'load_minutes': load,
+        'capacity_minutes': [
+            [capacity * days for days in bucket_days] for capacity in daily_capacity
+        ],
+    }
@@ -48,6 +48,31 @@ class WorkCenter(models.Model):
     def __str__(self):
         return f"{self.name} ({self.code})"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded rate so save() can refresh BOM costs on change
+        instance._loaded_cost_per_hour = instance.__dict__.get('cost_per_hour')
+        return instance
+    
+    def save(self, *args, **kwargs):
+        rate_changed = not self._state.adding and self.cost_per_hour != getattr(self, '_loaded_cost_per_hour', None)
+        super().save(*args, **kwargs)
+        
+        if rate_changed:
+            from bom.models import BOM
+            BOM.refresh_costs_for_work_centers([self.pk])
+            self._loaded_cost_per_hour = self.cost_per_hour
+    
+    def delete(self, *args, **kwargs):
+        # Operations at this work center are removed by the cascade; refresh
+        # the BOMs that held them afterwards
+        from bom.models import BOM, BOMOperation
+        bom_ids = list(BOMOperation.objects.filter(work_center=self).values_list('bom_id', flat=True))
+        result = super().delete(*args, **kwargs)
+        BOM.refresh_costs(bom_ids)
+        return result
+    
     def get_daily_capacity_minutes(self):
         """Get daily capacity in minutes"""
         return float(self.capacity_hours_per_day) * 60
@@ -1,3 +1,105 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from manufacturing.models import WorkOrder
+from tests.factories import User, build_mo
+from .models import WorkCenter
+
+
+class WorkCenterLoadTest(TestCase):
+    """Open work order minutes are bucketed per work center in one grouped query"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='planner', email='planner@example.com', password='x'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_load_by_day_and_week(self):
+        # Four work orders, two of them pending (sequences 2 and 4)
+        mo = build_mo(self.user, work_order_count=4, component_count=0)
+        mo.status = 'CONFIRMED'
+        mo.scheduled_start_date = date(2025, 6, 3)
+        mo.save()
+        center = WorkCenter.objects.get(code='ASM')
+        # Placed by the scheduler on the 5th; the other falls back to the MO date
+        WorkOrder.objects.filter(mo=mo, sequence=4).update(
+            scheduled_start_date=datetime(2025, 6, 5, 9, tzinfo=dt_timezone.utc)
+        )
+        # Half done: only the remaining estimate counts
+        WorkOrder.objects.filter(mo=mo, sequence=2).update(status='PAUSED', actual_duration_minutes=20)
+        WorkCenter.objects.create(name='Paint', code='PNT', capacity_hours_per_day=Decimal('16'))
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/workcenters/load/?from=2025-06-02&to=2025-06-05')
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        self.assertEqual(data['buckets'], [date(2025, 6, d) for d in range(2, 6)])
+        self.assertEqual(data['work_centers']['code'], ['ASM', 'PNT'])
+        self.assertEqual(data['load_minutes'], [[0, 30, 0, 50], [0, 0, 0, 0]])
+        self.assertEqual(data['capacity_minutes'][1], [960.0] * 4)
+
+        # Weeks start on Monday; the late work before `from` is backlog
+        response = self.client.get('/api/workcenters/load/?from=2025-06-04&to=2025-06-10&bucket=week')
+        data = response.data
+        self.assertEqual(data['buckets'], [date(2025, 6, 2), date(2025, 6, 9)])
+        self.assertEqual(data['bucket_days'], [5, 2])
+        self.assertEqual(data['load_minutes'][0], [50, 0])
+        self.assertEqual(data['work_centers']['backlog_minutes'], [30, 0])
+        self.assertEqual(data['capacity_minutes'][0], [2400.0, 960.0])
+
+        response = self.client.get('/api/workcenters/load/?bucket=month')
+        self.assertEqual(response.status_code, 400)
+
+
+class WorkCenterUtilizationTest(TestCase):
+    """Utilization is aggregated per work center in SQL and briefly cached"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='supervisor', email='supervisor@example.com', password='x'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_fleet_and_single_center_utilization(self):
+        mo = build_mo(self.user, work_order_count=3, component_count=0)
+        now = timezone.now()
+        # Estimated 50 minutes each: 100%, 50% efficient, and one outside the window
+        for sequence, actual, started in [(1, 50, 1), (2, 100, 3), (3, 40, 45)]:
+            WorkOrder.objects.filter(mo=mo, sequence=sequence).update(
+                actual_duration_minutes=actual, actual_start_date=now - timedelta(days=started)
+            )
+        idle = WorkCenter.objects.create(name='Paint', code='PNT')
+
+        # Work centers + the windowed work order totals
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/workcenters/utilization/?days=30')
+        self.assertEqual(response.status_code, 200)
+        rows = {row['work_center']['code']: row for row in response.data['work_centers']}
+        self.assertEqual(rows['ASM']['total_work_orders'], 2)
+        self.assertEqual(rows['ASM']['total_minutes_used'], 150)
+        self.assertEqual(rows['ASM']['average_efficiency'], 75.0)
+        self.assertEqual(rows['ASM']['utilization_percentage'], round(150 / (480 * 30) * 100, 2))
+        self.assertEqual(rows['PNT']['total_work_orders'], 0)
+        self.assertIsNone(rows['PNT']['average_efficiency'])
+        self.assertEqual(response.data['totals']['total_minutes_used'], 150)
+
+        # Served from cache until refreshed
+        with self.assertNumQueries(0):
+            self.client.get('/api/workcenters/utilization/?days=30')
+        response = self.client.get('/api/workcenters/utilization/?days=60&refresh=true')
+        self.assertEqual(response.data['totals']['total_work_orders'], 3)
 
-# Create your tests here.
+        response = self.client.get(f'/api/workcenters/{idle.pk}/utilization/?days=7')
+        self.assertEqual(response.data['period_days'], 7)
+        self.assertEqual(response.data['capacity_minutes'], 480 * 7)
+        response = self.client.get('/api/workcenters/utilization/?days=0')
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,76 @@
+"""
+Work center utilization over a trailing window, for one or all centers.
+
+Work order time, counts and efficiency are summed by the database in one
+grouped query over the work orders started in the window, which the
+(actual_start_date, work_center) index serves as a range scan; the totals
+are then matched to the work centers, so the cost follows the window rather
+than how much history each center has.
+"""
+from datetime import timedelta
+
+from django.db.models import Avg, Case, Count, F, FloatField, Sum, When
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from manufacturing.models import WorkOrder
+from .models import WorkCenter
+
+DEFAULT_DAYS = 30
+MAX_DAYS = 3650
+
+
+def utilization(work_centers=None, days=DEFAULT_DAYS):
+    """
+    Utilization of each work center over the last ``days`` days.
+
+    Work orders count when they were started in the window. Average
+    efficiency is the mean of ``WorkOrder.get_efficiency_percentage()``
+    over the work orders with recorded time; those without recorded time
+    have no efficiency yet and are left out of it.
+    """
+    if not 1 <= days <= MAX_DAYS:
+        raise ValueError(f'days must be between 1 and {MAX_DAYS}')
+    end = timezone.now()
+    start = end - timedelta(days=days)
+
+    centers = (work_centers if work_centers is not None else WorkCenter.objects.all()).order_by('code')
+    work_orders = WorkOrder.objects.filter(actual_start_date__gte=start, actual_start_date__lte=end)
+    if work_centers is not None:
+        work_orders = work_orders.filter(work_center__in=work_centers)
+    efficiency = Case(
+        When(
+            actual_duration_minutes__gt=0,
+            then=Cast('estimated_duration_minutes', FloatField()) * 100 / F('actual_duration_minutes'),
+        ),
+        output_field=FloatField(),
+    )
+    totals = {
+        row['work_center']: row
+        for row in work_orders.values('work_center').annotate(
+            total_work_orders=Count('pk'),
+            total_minutes_used=Sum('actual_duration_minutes'),
+            average_efficiency=Avg(efficiency),
+        ).order_by()
+    }
+
+    rows = []
+    for center in centers:
+        total = totals.get(center.pk, {})
+        minutes_used = total.get('total_minutes_used') or 0
+        average_efficiency = total.get('average_efficiency')
+        capacity_minutes = center.get_daily_capacity_minutes() * days
+        rows.append({
+            'work_center': center,
+            'period_days': days,
+            'total_work_orders': total.get('total_work_orders', 0),
+            'total_minutes_used': minutes_used,
+            'capacity_minutes': capacity_minutes,
+            'utilization_percentage': round(
+                minutes_used / capacity_minutes * 100 if capacity_minutes > 0 else 0, 2
+            ),
+            'average_efficiency': (
+                round(average_efficiency, 2) if average_efficiency is not None else None
+            ),
+        })
+    return rows
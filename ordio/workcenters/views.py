@@ -3,8 +3,18 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.filters import SearchFilter, OrderingFilter
+from datetime import timedelta
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .load import DEFAULT_WEEKS, work_center_load
 from .models import WorkCenter
 from .serializers import WorkCenterSerializer, WorkCenterListSerializer
+from .utilization import DEFAULT_DAYS, utilization
+
+# Seconds a fleet utilization snapshot may be served; the window trails
+# now, so a snapshot drifts by at most this much
+UTILIZATION_CACHE_TIMEOUT = 120
 
 class WorkCenterViewSet(viewsets.ModelViewSet):
     """
@@ -29,41 +39,88 @@ class WorkCenterViewSet(viewsets.ModelViewSet):
         GET /api/workcenters/active/
         """
         active_centers = WorkCenter.objects.filter(is_active=True)
+        page = self.paginate_queryset(active_centers)
+        if page is not None:
+            serializer = WorkCenterListSerializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        
         serializer = WorkCenterListSerializer(active_centers, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def load(self, request):
+        """
+        Planned open work order minutes vs capacity per work center, by day or week
+        GET /api/workcenters/load/?from=YYYY-MM-DD&to=YYYY-MM-DD&bucket=day|week
+        """
+        params = request.query_params
+        try:
+            date_from = parse_date(params['from']) if params.get('from') else timezone.localdate()
+            date_to = (
+                parse_date(params['to']) if params.get('to')
+                else date_from + timedelta(weeks=DEFAULT_WEEKS, days=-1)
+            )
+            if date_from is None or date_to is None:
+                raise ValueError('from/to must be dates (YYYY-MM-DD)')
+            return Response(work_center_load(date_from, date_to, params.get('bucket', 'day')))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
     @action(detail=True, methods=['get'])
     def utilization(self, request, pk=None):
         """
         Get work center utilization statistics
-        GET /api/workcenters/{id}/utilization/
+        GET /api/workcenters/{id}/utilization/?days=30
         """
         work_center = self.get_object()
+        try:
+            days = int(request.query_params.get('days', DEFAULT_DAYS))
+            row = utilization(WorkCenter.objects.filter(pk=work_center.pk), days)[0]
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get work orders for this work center
-        from manufacturing.models import WorkOrder
-        from django.utils import timezone
-        from datetime import timedelta
-        
-        # Last 30 days
-        end_date = timezone.now()
-        start_date = end_date - timedelta(days=30)
+        row['work_center'] = WorkCenterListSerializer(row['work_center']).data
+        return Response(row)
+    
+    @action(detail=False, methods=['get'], url_path='utilization', url_name='fleet-utilization')
+    def fleet_utilization(self, request):
+        """
+        Utilization of every active work center; cached briefly unless refresh=true
+        GET /api/workcenters/utilization/?days=30&refresh=true
+        """
+        try:
+            days = int(request.query_params.get('days', DEFAULT_DAYS))
+        except ValueError:
+            return Response({'error': 'days must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
         
-        work_orders = WorkOrder.objects.filter(
-            work_center=work_center,
-            actual_start_date__gte=start_date,
-            actual_start_date__lte=end_date
-        )
+        cache_key = f'workcenters:utilization:{days}'
+        if request.query_params.get('refresh', '').lower() not in ('1', 'true', 'yes'):
+            data = cache.get(cache_key)
+            if data is not None:
+                return Response(data)
         
-        total_minutes = sum(wo.actual_duration_minutes for wo in work_orders if wo.actual_duration_minutes)
-        capacity_minutes = float(work_center.get_daily_capacity_minutes()) * 30
-        utilization_percentage = (total_minutes / capacity_minutes * 100) if capacity_minutes > 0 else 0
+        try:
+            rows = utilization(WorkCenter.objects.filter(is_active=True), days)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response({
-            'work_center': WorkCenterListSerializer(work_center).data,
-            'period_days': 30,
-            'total_work_orders': work_orders.count(),
-            'total_minutes_used': total_minutes,
-            'capacity_minutes': capacity_minutes,
-            'utilization_percentage': round(utilization_percentage, 2)
-        })
+        for row in rows:
+            row['work_center'] = WorkCenterListSerializer(row['work_center']).data
+        minutes_used = sum(row['total_minutes_used'] for row in rows)
+        capacity_minutes = sum(row['capacity_minutes'] for row in rows)
+        data = {
+            'period_days': days,
+            'generated_at': timezone.now(),
+            'work_centers': rows,
+            'totals': {
+                'work_centers': len(rows),
+                'total_work_orders': sum(row['total_work_orders'] for row in rows),
+                'total_minutes_used': minutes_used,
+                'capacity_minutes': capacity_minutes,
+                'utilization_percentage': round(
+                    minutes_used / capacity_minutes * 100 if capacity_minutes > 0 else 0, 2
+                ),
+            },
+        }
+        cache.set(cache_key, data, UTILIZATION_CACHE_TIMEOUT)
+        return Response(data)